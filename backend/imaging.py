@@ -0,0 +1,30 @@
+"""Image work run in cpu_pool worker processes
+
+Kept free of import side effects (no database clients, caches or
+settings), so worker processes can import it without the server.
+"""
+import io
+from typing import List
+
+from PIL import Image, ImageOps
+
+
+def render_derivatives(data: bytes, sizes: tuple, image_format: str) -> List[tuple]:
+    """Resize an image to fit each size; runs in a worker process
+
+    Returns (size, encoded bytes, width, height) tuples.
+    """
+    with Image.open(io.BytesIO(data)) as source:
+        image = ImageOps.exif_transpose(source)
+        if image_format == 'JPEG':
+            image = image.convert('RGB')
+        elif image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA')
+        results = []
+        for size in sizes:
+            resized = image.copy()
+            resized.thumbnail((size, size), Image.LANCZOS)
+            output = io.BytesIO()
+            resized.save(output, format=image_format, quality=80)
+            results.append((size, output.getvalue(), resized.width, resized.height))
+        return results
@@ -1,136 +1,3021 @@
-from fastapi import FastAPI, APIRouter, HTTPException, File, UploadFile, Form
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, APIRouter, HTTPException, File, UploadFile, Form, Query, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse, Response, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
+from starlette.routing import Match
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorGridFSBucket
+from pymongo import monitoring
+from pymongo import ASCENDING, DESCENDING, TEXT, IndexModel, ReturnDocument, UpdateOne
+from pymongo.read_preferences import Nearest, Primary, PrimaryPreferred, Secondary, SecondaryPreferred
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
 import os
 import logging
+import multiprocessing
 from pathlib import Path
-from pydantic import BaseModel, Field
-from typing import List, Optional, Any
+from pydantic import BaseModel, Field, ValidationError
+from typing import List, Dict, Optional, Any, Union, AsyncIterator, Awaitable, Callable, Literal
 import uuid
-from datetime import datetime
+from urllib.parse import quote
+from datetime import datetime, timedelta, timezone
+from abc import ABC, abstractmethod
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import aclosing, contextmanager
+from email.utils import format_datetime, parsedate_to_datetime
+from types import MappingProxyType
+import asyncio
 import base64
+import bisect
+import io
+import itertools
+import hashlib
 import json
+import mimetypes
+import re
+import tempfile
+import threading
+import time
+import unicodedata
+
+try:
+    import redis.asyncio as redis_asyncio
+except ImportError:  # Only needed for CACHE_BACKEND=redis
+    redis_asyncio = None
+
+try:
+    from PIL import Image
+    from imaging import render_derivatives
+except ImportError:  # Without Pillow no image derivatives are generated
+    Image = None
+
+try:
+    import orjson
+except ImportError:  # Only needed for FAST_JSON
+    orjson = None
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+# Opt-in: serialize with orjson and skip re-validating documents we wrote ourselves
+FAST_JSON = os.environ.get('FAST_JSON', '').lower() in ('1', 'true', 'yes')
+if FAST_JSON and orjson is None:
+    raise RuntimeError("FAST_JSON requires the orjson package")
+
+# Metrics, exposed in the Prometheus text format on /metrics
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864)
+
+def escape_label_value(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def format_labels(labelnames: tuple, values: tuple, extra: tuple = ()) -> str:
+    pairs = [f'{name}="{escape_label_value(value)}"' for name, value in zip(labelnames, values)]
+    pairs += [f'{name}="{value}"' for name, value in extra]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Metric:
+    """A named metric with one value per combination of label values
+
+    Updates may come from pymongo's monitoring threads, so they take a lock.
+    """
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def key(self, labels: dict) -> tuple:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self) -> List[str]:
+        with self.lock:
+            return [
+                f"{self.name}{format_labels(self.labelnames, key)} {value}"
+                for key, value in sorted(self.values.items())
+            ]
+
+    def render(self) -> str:
+        header = f"# HELP {self.name} {self.documentation}\n# TYPE {self.name} {self.kind}\n"
+        return header + "".join(line + "\n" for line in self.samples())
+
+class CounterMetric(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+class GaugeMetric(CounterMetric):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+class HistogramMetric(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (),
+                 buckets: tuple = DURATION_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = buckets
+
+    def observe(self, value: float, **labels) -> None:
+        key = self.key(labels)
+        # Per-bucket counts with a trailing overflow bucket, and the running sum
+        position = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            counts, total = self.values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[position] += 1
+            self.values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self) -> List[str]:
+        with self.lock:
+            items = sorted((key, list(counts), total) for key, (counts, total) in self.values.items())
+        lines = []
+        for key, counts, total in items:
+            bounds = [str(bound) for bound in self.buckets] + ["+Inf"]
+            for bound, cumulative in zip(bounds, itertools.accumulate(counts)):
+                labels = format_labels(self.labelnames, key, (("le", bound),))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(self.labelnames, key)} {total}")
+            lines.append(f"{self.name}_count{format_labels(self.labelnames, key)} {sum(counts)}")
+        return lines
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "".join(metric.render() for metric in self.metrics)
+
+metrics = MetricsRegistry()
+
+HTTP_REQUESTS = metrics.register(CounterMetric(
+    "http_requests_total", "HTTP requests by route and status code", ("method", "route", "status")))
+HTTP_REQUEST_DURATION = metrics.register(HistogramMetric(
+    "http_request_duration_seconds", "Time to fully send an HTTP response", ("method", "route")))
+HTTP_REQUEST_SIZE = metrics.register(HistogramMetric(
+    "http_request_size_bytes", "HTTP request body size", ("route",), SIZE_BUCKETS))
+HTTP_RESPONSE_SIZE = metrics.register(HistogramMetric(
+    "http_response_size_bytes", "HTTP response body size", ("route",), SIZE_BUCKETS))
+HTTP_IN_FLIGHT = metrics.register(GaugeMetric(
+    "http_requests_in_flight", "HTTP requests currently being served", ("route",)))
+MONGO_COMMAND_DURATION = metrics.register(HistogramMetric(
+    "mongodb_command_duration_seconds", "MongoDB command round trips", ("command", "collection", "outcome")))
+BASE64_DURATION = metrics.register(HistogramMetric(
+    "base64_duration_seconds", "Time spent encoding and decoding base64 media", ("operation",)))
+SERIALIZATION_DURATION = metrics.register(HistogramMetric(
+    "serialization_duration_seconds", "Time spent validating and encoding response models", ("stage",)))
+MONGO_POOL_WAIT = metrics.register(HistogramMetric(
+    "mongodb_pool_wait_seconds", "Time spent waiting to check out a pooled MongoDB connection", ("outcome",)))
+MONGO_POOL_CONNECTIONS = metrics.register(GaugeMetric(
+    "mongodb_pool_connections", "Pooled MongoDB connections by server and state", ("address", "state")))
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Time every MongoDB command by name and collection"""
+
+    def __init__(self):
+        self.collections = {}
+
+    def started(self, event) -> None:
+        collection = event.command.get(event.command_name)
+        if event.command_name == "getMore":
+            collection = event.command.get("collection")
+        self.collections[(event.connection_id, event.request_id)] = (
+            collection if isinstance(collection, str) else ""
+        )
+
+    def succeeded(self, event) -> None:
+        self.observe(event, "ok")
+
+    def failed(self, event) -> None:
+        self.observe(event, "error")
+
+    def observe(self, event, outcome: str) -> None:
+        collection = self.collections.pop((event.connection_id, event.request_id), "")
+        MONGO_COMMAND_DURATION.observe(
+            event.duration_micros / 1e6,
+            command=event.command_name,
+            collection=collection,
+            outcome=outcome
+        )
+
+class MongoPoolMetrics(monitoring.ConnectionPoolListener):
+    """Track pool checkout waits and open/checked-out connections"""
+
+    def __init__(self):
+        # Checkout start and finish are reported on the same driver thread
+        self.waiting = {}
+
+    @staticmethod
+    def address(event) -> str:
+        return "%s:%s" % event.address
+
+    def connection_check_out_started(self, event) -> None:
+        self.waiting[(event.address, threading.get_ident())] = time.perf_counter()
+
+    def observe_wait(self, event, outcome: str) -> None:
+        started = self.waiting.pop((event.address, threading.get_ident()), None)
+        if started is not None:
+            MONGO_POOL_WAIT.observe(time.perf_counter() - started, outcome=outcome)
+
+    def connection_checked_out(self, event) -> None:
+        self.observe_wait(event, "ok")
+        MONGO_POOL_CONNECTIONS.inc(address=self.address(event), state="checked_out")
+
+    def connection_check_out_failed(self, event) -> None:
+        self.observe_wait(event, event.reason)
+
+    def connection_checked_in(self, event) -> None:
+        MONGO_POOL_CONNECTIONS.dec(address=self.address(event), state="checked_out")
+
+    def connection_created(self, event) -> None:
+        MONGO_POOL_CONNECTIONS.inc(address=self.address(event), state="open")
+
+    def connection_closed(self, event) -> None:
+        MONGO_POOL_CONNECTIONS.dec(address=self.address(event), state="open")
+
+    def pool_created(self, event) -> None:
+        pass
+
+    def pool_ready(self, event) -> None:
+        pass
+
+    def pool_cleared(self, event) -> None:
+        pass
+
+    def pool_closed(self, event) -> None:
+        pass
+
+    def connection_ready(self, event) -> None:
+        pass
+
+# MongoDB connection
+MONGO_MIN_POOL_SIZE = int(os.environ.get('MONGO_MIN_POOL_SIZE', 10))
+
+READ_PREFERENCES = {
+    'primary': Primary,
+    'primaryPreferred': PrimaryPreferred,
+    'secondary': Secondary,
+    'secondaryPreferred': SecondaryPreferred,
+    'nearest': Nearest,
+}
+
+def create_mongo_client() -> AsyncIOMotorClient:
+    """Build the Motor client with pool sizing and timeouts from the environment
+
+    Motor connects lazily, so this does no I/O; see warm_up_db_pool.
+    """
+    return AsyncIOMotorClient(
+        os.environ['MONGO_URL'],
+        maxPoolSize=int(os.environ.get('MONGO_MAX_POOL_SIZE', 100)),
+        minPoolSize=MONGO_MIN_POOL_SIZE,
+        maxIdleTimeMS=int(os.environ.get('MONGO_MAX_IDLE_TIME_MS', 300000)),
+        # Fail fast instead of queueing requests behind a slow or absent server
+        waitQueueTimeoutMS=int(os.environ.get('MONGO_WAIT_QUEUE_TIMEOUT_MS', 5000)),
+        serverSelectionTimeoutMS=int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', 5000)),
+        connectTimeoutMS=int(os.environ.get('MONGO_CONNECT_TIMEOUT_MS', 5000)),
+        socketTimeoutMS=int(os.environ.get('MONGO_SOCKET_TIMEOUT_MS', 30000)),
+        event_listeners=[MongoCommandMetrics(), MongoPoolMetrics()]
+    )
+
+def feed_read_preference():
+    """Read preference for feed reads; anything but primary may read lagging data"""
+    name = os.environ.get('FEED_READ_PREFERENCE', 'primary')
+    if name not in READ_PREFERENCES:
+        raise ValueError(f"Unknown FEED_READ_PREFERENCE: {name}")
+    if name == 'primary':
+        return Primary()
+    # Mongo requires at least 90 seconds; -1 means no limit
+    return READ_PREFERENCES[name](max_staleness=int(os.environ.get('FEED_MAX_STALENESS_SECONDS', -1)))
+
+def bind_db(new_client) -> None:
+    """Point the module's client, db and feed_db at a (new) Motor client"""
+    global client, db, feed_db, feed_cacheable
+    client = new_client
+    db = client[os.environ['DB_NAME']]
+    feed_db = client.get_database(os.environ['DB_NAME'], read_preference=feed_read_preference())
+    # A lagging secondary could fill a freshly bumped feed version with pre-write data
+    feed_cacheable = feed_db.read_preference == Primary()
+
+bind_db(create_mongo_client())
+
+# Create the main app without a prefix
+app = FastAPI(default_response_class=ORJSONResponse if FAST_JSON else JSONResponse)
+
+# Create a router with the /api prefix
+api_router = APIRouter(prefix="/api")
+
+# Define Models
+class Derivative(BaseModel):
+    blob_id: str
+    media_type: str
+    width: int
+    height: int
+
+class ContentItem(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    type: str  # 'text', 'image', 'audio', 'video', 'file'
+    title: str
+    content: str  # For text content or legacy base64 encoded media
+    blob_id: Optional[str] = None  # SHA-256 digest of media in the blob store
+    derivatives: Dict[str, Derivative] = {}  # Resized images keyed by max edge in px
+    mime_type: Optional[str] = None  # Sniffed from the file's leading bytes
+    metadata: Dict[str, Any] = {}  # e.g. image width/height, filled in by jobs
+    status: str = "ready"  # 'processing' while a deferred upload is post-processed
+    file_name: Optional[str] = None
+    file_size: Optional[int] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+class ContentItemMeta(BaseModel):
+    id: str
+    type: str
+    title: str
+    content: Optional[str] = None  # Only returned when explicitly requested
+    blob_id: Optional[str] = None
+    derivatives: Dict[str, Derivative] = {}
+    mime_type: Optional[str] = None
+    metadata: Dict[str, Any] = {}
+    status: str = "ready"
+    file_name: Optional[str] = None
+    file_size: Optional[int] = None
+    created_at: datetime
+
+class UserProfile(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    name: str
+    email: str
+    bio: Optional[str] = None
+    avatar_blob_id: Optional[str] = None  # Decoded avatar image in the blob store
+    avatar_media_type: Optional[str] = None
+    avatar_url: Optional[str] = None  # Versioned, so it can be cached forever
+    avatar_version: Optional[str] = None
+    avatar_derivatives: Dict[str, Derivative] = {}
+    content_items: List[ContentItem] = []
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+class UserProfileCreate(BaseModel):
+    name: str
+    email: str
+    bio: Optional[str] = None
+    avatar: Optional[str] = None  # base64 encoded image, optionally a data: URL
+
+class ContentItemCreate(BaseModel):
+    type: str
+    title: str
+    content: str
+    file_name: Optional[str] = None
+    file_size: Optional[int] = None
+
+class BulkRowResult(BaseModel):
+    index: int
+    id: Optional[str] = None
+    error: Optional[str] = None
+
+class BulkCreateReport(BaseModel):
+    inserted: int
+    failed: int
+    results: List[BulkRowResult]
+
+class ProfileSummary(BaseModel):
+    id: str
+    name: str
+    email: str
+    bio: Optional[str] = None
+    avatar_url: Optional[str] = None
+    content_count: int = 0
+    content_type_counts: Dict[str, int] = {}
+    created_at: datetime
+    updated_at: datetime
+
+class ProfilePage(BaseModel):
+    items: List[UserProfile]
+    next_cursor: Optional[str] = None
+
+class ProfileSummaryPage(BaseModel):
+    items: List[ProfileSummary]
+    next_cursor: Optional[str] = None
+
+class ProfileBatchRequest(BaseModel):
+    ids: List[str]
+    fields: Optional[List[str]] = None  # Top-level UserProfile fields; all when omitted
+
+class ProfileBatchResult(BaseModel):
+    id: str
+    found: bool
+    profile: Optional[Dict[str, Any]] = None
+
+class ProfileBatchResponse(BaseModel):
+    results: List[ProfileBatchResult]  # In request order
+
+class ProfileChange(BaseModel):
+    op: str  # 'insert', 'update' or 'delete'
+    id: str
+    profile: Optional[ProfileSummary] = None  # Not sent for deletes
+
+class ProfileChangePage(BaseModel):
+    changes: List[ProfileChange]
+    next_token: str  # Pass as `since` to continue after these changes
+
+class ContentItemPage(BaseModel):
+    items: List[ContentItemMeta]
+    next_cursor: Optional[str] = None
+
+class UploadSessionCreate(BaseModel):
+    profile_id: str
+    title: str
+    file_name: str
+    file_size: int
+    chunk_size: Optional[int] = None
+
+class UploadSession(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    profile_id: str
+    title: str
+    file_name: str
+    file_size: int
+    chunk_size: int
+    chunk_count: int
+    received_chunks: List[int] = []
+    received_ranges: List[List[int]] = []  # Half-open byte ranges, derived
+    status: str = "pending"  # 'pending', 'finalizing', 'completed'
+    content_item_id: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+class Job(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    kind: str
+    payload: Dict[str, Any] = {}
+    status: str = "queued"  # 'queued', 'running', 'succeeded', 'failed'
+    progress: float = 0.0
+    attempts: int = 0
+    max_attempts: int = 3
+    error: Optional[str] = None
+    result: Optional[Dict[str, Any]] = None
+    run_after: datetime = Field(default_factory=datetime.utcnow)
+    lease_expires_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+class StatusCheck(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    client_name: str
+    timestamp: datetime = Field(default_factory=datetime.utcnow)
+
+class StatusCheckCreate(BaseModel):
+    client_name: str
+
+class StatusCheckPage(BaseModel):
+    items: List[StatusCheck]
+    next_cursor: Optional[str] = None
+
+# Utility functions
+def convert_file_to_base64(file_content: bytes) -> str:
+    """Convert file content to base64 string"""
+    with BASE64_DURATION.time(operation="encode"):
+        return base64.b64encode(file_content).decode('utf-8')
+
+# File type registry: extension -> (content type, MIME type)
+FILE_EXTENSIONS = MappingProxyType({
+    'jpg': ('image', 'image/jpeg'),
+    'jpeg': ('image', 'image/jpeg'),
+    'png': ('image', 'image/png'),
+    'gif': ('image', 'image/gif'),
+    'bmp': ('image', 'image/bmp'),
+    'webp': ('image', 'image/webp'),
+    'svg': ('image', 'image/svg+xml'),
+    'mp4': ('video', 'video/mp4'),
+    'avi': ('video', 'video/x-msvideo'),
+    'mov': ('video', 'video/quicktime'),
+    'wmv': ('video', 'video/x-ms-wmv'),
+    'flv': ('video', 'video/x-flv'),
+    'webm': ('video', 'video/webm'),
+    'mkv': ('video', 'video/x-matroska'),
+    'mp3': ('audio', 'audio/mpeg'),
+    'wav': ('audio', 'audio/wav'),
+    'flac': ('audio', 'audio/flac'),
+    'aac': ('audio', 'audio/aac'),
+    'ogg': ('audio', 'audio/ogg'),
+    'm4a': ('audio', 'audio/mp4'),
+    'txt': ('text', 'text/plain; charset=utf-8'),
+    'md': ('text', 'text/markdown; charset=utf-8'),
+})
+
+# Binary content we cannot classify more precisely
+UNKNOWN_FILE_TYPE = ('file', 'application/octet-stream')
+
+def lookup_extension(filename: str) -> Optional[tuple]:
+    """(content type, MIME type) registered for a filename's extension, if any"""
+    _, dot, ext = filename.rpartition('.')
+    return FILE_EXTENSIONS.get(ext.lower()) if dot else None
+
+def get_file_type(filename: str) -> str:
+    """Determine file type based on extension"""
+    entry = lookup_extension(filename)
+    return entry[0] if entry else UNKNOWN_FILE_TYPE[0]
+
+# Leading bytes of common formats, trusted over the file extension
+FILE_SIGNATURES = (
+    (b'\x89PNG\r\n\x1a\n', ('image', 'image/png')),
+    (b'\xff\xd8\xff', ('image', 'image/jpeg')),
+    (b'GIF87a', ('image', 'image/gif')),
+    (b'GIF89a', ('image', 'image/gif')),
+    (b'BM', ('image', 'image/bmp')),
+    (b'\x1aE\xdf\xa3', ('video', 'video/webm')),
+    (b'FLV\x01', ('video', 'video/x-flv')),
+    (b'0&\xb2u\x8ef\xcf\x11', ('video', 'video/x-ms-wmv')),
+    (b'ID3', ('audio', 'audio/mpeg')),
+    (b'\xff\xfb', ('audio', 'audio/mpeg')),
+    (b'\xff\xf3', ('audio', 'audio/mpeg')),
+    (b'\xff\xf2', ('audio', 'audio/mpeg')),
+    (b'\xff\xf1', ('audio', 'audio/aac')),
+    (b'\xff\xf9', ('audio', 'audio/aac')),
+    (b'fLaC', ('audio', 'audio/flac')),
+    (b'OggS', ('audio', 'audio/ogg')),
+    (b'%PDF-', ('file', 'application/pdf')),
+    (b'PK\x03\x04', ('file', 'application/zip')),
+)
+
+# Known BITMAPINFOHEADER family sizes, from OS/2 (12) to BITMAPV5HEADER (124)
+BMP_DIB_HEADER_SIZES = frozenset((12, 16, 40, 52, 56, 64, 108, 124))
+
+def is_bmp_header(head: bytes) -> bool:
+    """'BM' is common in text, so also require zero reserved bytes and a known DIB header"""
+    return (
+        len(head) >= 18
+        and head[6:10] == b'\x00\x00\x00\x00'
+        and int.from_bytes(head[14:18], 'little') in BMP_DIB_HEADER_SIZES
+    )
+
+def is_mpeg_audio_header(head: bytes) -> bool:
+    """A frame sync must be followed by a valid bitrate and sample rate index"""
+    return len(head) >= 4 and (head[2] >> 4) not in (0, 15) and (head[2] >> 2) & 3 != 3
+
+def is_adts_header(head: bytes) -> bool:
+    """An ADTS sync must be followed by a valid sample rate index and frame length"""
+    if len(head) < 7:
+        return False
+    frame_length = ((head[3] & 3) << 11) | (head[4] << 3) | (head[5] >> 5)
+    return (head[2] >> 2) & 0xF < 13 and frame_length >= 7
+
+# Signatures too short to trust alone, with the header check that confirms them
+SIGNATURE_CHECKS = MappingProxyType({
+    b'BM': is_bmp_header,
+    b'\xff\xfb': is_mpeg_audio_header,
+    b'\xff\xf3': is_mpeg_audio_header,
+    b'\xff\xf2': is_mpeg_audio_header,
+    b'\xff\xf1': is_adts_header,
+    b'\xff\xf9': is_adts_header,
+})
+
+# Signatures grouped by first byte, so sniffing checks only plausible candidates
+SIGNATURES_BY_FIRST_BYTE = MappingProxyType({
+    first: tuple(entry for entry in FILE_SIGNATURES if entry[0][0] == first)
+    for first in {signature[0] for signature, _ in FILE_SIGNATURES}
+})
+
+# Signatures shared by related formats, told apart by extension; FILE_SIGNATURES holds the default
+SHARED_SIGNATURE_FORMATS = MappingProxyType({
+    b'\x1aE\xdf\xa3': frozenset({('video', 'video/webm'), ('video', 'video/x-matroska')}),
+})
+
+RIFF_FORMATS = MappingProxyType({
+    b'WEBP': ('image', 'image/webp'),
+    b'WAVE': ('audio', 'audio/wav'),
+    b'AVI ': ('video', 'video/x-msvideo'),
+})
+
+# ISO base media (MP4 family) major brands that are not plain video/mp4
+FTYP_BRANDS = MappingProxyType({
+    b'M4A ': ('audio', 'audio/mp4'),
+    b'M4B ': ('audio', 'audio/mp4'),
+    b'qt  ': ('video', 'video/quicktime'),
+})
+
+def looks_like_text(head: bytes) -> bool:
+    """Whether leading bytes are UTF-8 text, allowing a character cut off at the end"""
+    if b'\x00' in head:
+        return False
+    try:
+        head.decode('utf-8')
+    except UnicodeDecodeError as e:
+        return e.reason == 'unexpected end of data' and e.start >= len(head) - 3
+    return True
+
+def sniff_file_type(head: bytes, filename: str) -> tuple:
+    """Determine (content type, MIME type) from a file's first bytes
+
+    Magic bytes win over the extension; the extension is only used for
+    formats without a signature (e.g. SVG) and unknown binary content is
+    reported as a generic file rather than text.
+    """
+    for signature, file_type in SIGNATURES_BY_FIRST_BYTE.get(head[0] if head else None, ()):
+        if head.startswith(signature):
+            check = SIGNATURE_CHECKS.get(signature)
+            if check is not None and not check(head):
+                continue
+            entry = lookup_extension(filename)
+            if entry in SHARED_SIGNATURE_FORMATS.get(signature, ()):
+                return entry
+            return file_type
+    if head[:4] == b'RIFF' and head[8:12] in RIFF_FORMATS:
+        return RIFF_FORMATS[head[8:12]]
+    if head[4:8] == b'ftyp':
+        return FTYP_BRANDS.get(head[8:12], ('video', 'video/mp4'))
+    entry = lookup_extension(filename)
+    if entry:
+        return entry
+    if looks_like_text(head):
+        return ('text', 'text/plain; charset=utf-8')
+    return UNKNOWN_FILE_TYPE
+
+def encode_cursor(created_at: datetime, item_id: str) -> str:
+    """Encode a (created_at, id) feed position as an opaque cursor"""
+    raw = json.dumps({"c": created_at.isoformat(), "i": item_id})
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('utf-8').rstrip('=')
+
+def decode_cursor(cursor: str) -> tuple:
+    """Decode an opaque cursor back into its (created_at, id) position"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        data = json.loads(raw)
+        return datetime.fromisoformat(data["c"]), data["i"]
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def encode_offset_cursor(offset: int) -> str:
+    """Encode a position within an embedded array as an opaque cursor"""
+    raw = json.dumps({"o": offset})
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('utf-8').rstrip('=')
+
+def decode_offset_cursor(cursor: str) -> int:
+    """Decode an opaque array cursor back into its offset"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        offset = json.loads(raw)["o"]
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(offset, int) or offset < 0:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return offset
+
+def encode_search_cursor(value: Union[float, str], item_id: str) -> str:
+    """Encode a (sort value, id) search position as an opaque cursor"""
+    raw = json.dumps({"v": value, "i": item_id})
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('utf-8').rstrip('=')
+
+def decode_search_cursor(cursor: str) -> tuple:
+    """Decode an opaque search cursor back into its (sort value, id) position"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        data = json.loads(raw)
+        value, item_id = data["v"], data["i"]
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(value, (int, float, str)) or not isinstance(item_id, str):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return value, item_id
+
+def keyset_filter(cursor: Optional[str], field: str = "created_at") -> dict:
+    """Build the filter selecting documents strictly after a cursor position"""
+    if not cursor:
+        return {}
+    value, item_id = decode_cursor(cursor)
+    return {"$or": [
+        {field: {"$lt": value}},
+        {field: value, "id": {"$lt": item_id}}
+    ]}
+
+MEDIA_TYPES = ('image', 'video', 'audio')
+
+DEFAULT_MEDIA_TYPES = {
+    'image': 'image/jpeg',
+    'video': 'video/mp4',
+    'audio': 'audio/mpeg',
+    'text': 'text/plain; charset=utf-8',
+}
+
+def stored_as_base64(item: dict) -> bool:
+    """Whether an item without a blob keeps its bytes base64 encoded in content
+
+    Uploaded files were stored that way whatever their type, including the
+    ones once typed 'text' by extension, so file_name marks them too.
+    """
+    return item.get("type") in MEDIA_TYPES or bool(item.get("file_name"))
+
+def media_type_for(item: dict) -> str:
+    """Pick the Content-Type to serve a content item's media with"""
+    if item.get("mime_type"):
+        return item["mime_type"]
+    guessed = mimetypes.guess_type(item.get("file_name") or "")[0]
+    return guessed or DEFAULT_MEDIA_TYPES.get(item.get("type"), "application/octet-stream")
+
+# Conditional requests
+# JSON resources can change at any time, so clients revalidate with the ETag
+REVALIDATE_CACHE_CONTROL = "no-cache"
+# Media of an item never changes once uploaded
+MEDIA_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Served from the API origin, so anything that could run script (SVG, HTML,
+# PDF...) is sandboxed and downloaded rather than rendered inline
+INLINE_MEDIA_TYPES = ('image/png', 'image/jpeg', 'image/gif', 'image/webp', 'image/bmp',
+                      'text/plain', 'text/markdown')
+
+def media_security_headers(media_type: str, file_name: Optional[str]) -> dict:
+    """Headers that stop user uploads from being sniffed or run as active content"""
+    headers = {"X-Content-Type-Options": "nosniff", "Content-Security-Policy": "sandbox"}
+    base_type = media_type.split(';')[0].strip().lower()
+    if base_type not in INLINE_MEDIA_TYPES and not base_type.startswith(('audio/', 'video/')):
+        disposition = "attachment"
+        if file_name:
+            disposition += f"; filename*=UTF-8''{quote(file_name)}"
+        headers["Content-Disposition"] = disposition
+    return headers
+
+def profile_etag(profile_id: str, updated_at: datetime) -> str:
+    """ETag for a profile, changing whenever the profile is written"""
+    digest = hashlib.blake2b(f"{profile_id}:{updated_at.isoformat()}".encode('utf-8'), digest_size=12)
+    return f'"{digest.hexdigest()}"'
+
+def body_etag(body: bytes) -> str:
+    """ETag for a serialized response body"""
+    return f'"{hashlib.blake2b(body, digest_size=12).hexdigest()}"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Weak comparison of an If-None-Match header against an ETag"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return etag.removeprefix("W/") in tags
+
+def not_modified_since(request: Request, etag: str, last_modified: datetime) -> bool:
+    """Evaluate If-None-Match, falling back to If-Modified-Since"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        return etag_matches(if_none_match, etag)
+    if_modified_since = request.headers.get("if-modified-since")
+    if not if_modified_since:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    # HTTP dates have whole-second precision
+    return last_modified.replace(tzinfo=timezone.utc, microsecond=0) <= since
+
+def not_modified(headers: dict) -> Response:
+    return Response(status_code=304, headers=headers)
+
+def format_http_date(value: datetime) -> str:
+    """Format a naive UTC datetime for Last-Modified style headers"""
+    return format_datetime(value.replace(tzinfo=timezone.utc), usegmt=True)
+
+def parse_range_header(header: Optional[str], size: int) -> Optional[tuple]:
+    """Parse a single 'bytes=' range into a half-open (start, end) pair
+
+    Returns None when the whole entity should be sent, including for
+    invalid ranges such as last < first (RFC 9110 ignores those);
+    unsatisfiable ranges raise a 416.
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    first, _, last = header[len("bytes="):].strip().partition("-")
+    try:
+        if first:
+            start = int(first)
+            end = int(last) + 1 if last else size
+            if last and end <= start:
+                return None
+        else:
+            start, end = max(size - int(last), 0), size
+    except ValueError:
+        return None
+    end = min(end, size)
+    if start >= end:
+        raise HTTPException(
+            status_code=416,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{size}"}
+        )
+    return start, end
+
+def base64_decoded_size(content: str) -> int:
+    """Size in bytes of base64 content without decoding it"""
+    return len(content) // 4 * 3 - content[-2:].count('=')
+
+async def iter_base64_range(content: str, start: int, end: int,
+                            chunk_size: int = 192 * 1024) -> AsyncIterator[bytes]:
+    """Decode the [start, end) byte range of base64 content chunk by chunk"""
+    # Every 4 base64 characters decode to 3 bytes, so align on 3-byte groups
+    position = start - start % 3
+    while position < end:
+        group_end = min(position + chunk_size, end + (-end % 3))
+        with BASE64_DURATION.time(operation="decode"):
+            chunk = base64.b64decode(content[position // 3 * 4:group_end // 3 * 4])
+        yield chunk[max(start - position, 0):end - position]
+        position = group_end
+
+# Blob storage
+BLOB_CHUNK_SIZE = 256 * 1024
+
+def is_blob_digest(value: str) -> bool:
+    """Whether a client-supplied blob id has the shape of a stored digest"""
+    return len(value) == 64 and all(c in '0123456789abcdef' for c in value)
+
+class BlobStore(ABC):
+    """Content-addressed media storage keyed by SHA-256 digest"""
+
+    @abstractmethod
+    async def exists(self, digest: str) -> bool:
+        ...
+
+    @abstractmethod
+    async def size(self, digest: str) -> Optional[int]:
+        """Return the stored size in bytes, or None if the blob is missing"""
+
+    @abstractmethod
+    async def write(self, digest: str, data: bytes) -> None:
+        ...
+
+    @abstractmethod
+    async def delete(self, digest: str) -> None:
+        ...
+
+    @abstractmethod
+    def iter_chunks(self, digest: str, start: int = 0, end: Optional[int] = None,
+                    chunk_size: int = BLOB_CHUNK_SIZE) -> AsyncIterator[bytes]:
+        """Yield the bytes in [start, end) of a blob, chunk_size at a time"""
+
+    async def read(self, digest: str) -> bytes:
+        """Read a whole blob into memory; only for inputs known to be small"""
+        return b"".join([chunk async for chunk in self.iter_chunks(digest)])
+
+    async def put(self, data: bytes, reserve: Optional[Callable[[str], Awaitable[None]]] = None) -> str:
+        """Store data once per distinct content and return its digest
+
+        ``reserve`` is awaited with the digest before checking whether the
+        blob already exists, so a blob it pins can't be collected between
+        that check and its use.
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        if reserve is not None:
+            await reserve(digest)
+        if not await self.exists(digest):
+            await self.write(digest, data)
+        return digest
+
+    @abstractmethod
+    async def put_stream(self, chunks: AsyncIterator[bytes],
+                         reserve: Optional[Callable[[str], Awaitable[None]]] = None) -> str:
+        """Store a stream of chunks, hashing as they arrive, and return its digest; see put"""
+
+class LocalBlobStore(BlobStore):
+    """Blob store on the local filesystem, mainly for tests and development
+
+    Filesystem calls run in threads so a slow disk never blocks the event loop.
+    """
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+
+    def _path(self, digest: str) -> Path:
+        return self.root / digest[:2] / digest[2:4] / digest
+
+    async def exists(self, digest: str) -> bool:
+        return await asyncio.to_thread(self._path(digest).exists)
+
+    def _size_sync(self, digest: str) -> Optional[int]:
+        try:
+            return self._path(digest).stat().st_size
+        except FileNotFoundError:
+            return None
+
+    async def size(self, digest: str) -> Optional[int]:
+        return await asyncio.to_thread(self._size_sync, digest)
+
+    def _write_sync(self, digest: str, data: bytes) -> None:
+        path = self._path(digest)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temp file first so readers never see a partial blob
+        fd, tmp = tempfile.mkstemp(dir=path.parent)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    async def write(self, digest: str, data: bytes) -> None:
+        await asyncio.to_thread(self._write_sync, digest, data)
+
+    @staticmethod
+    def _hash_and_write(sha256, f, chunk: bytes) -> None:
+        sha256.update(chunk)
+        f.write(chunk)
+
+    def _open_staging(self) -> tuple:
+        staging = self.root / 'staging'
+        staging.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=staging)
+        return os.fdopen(fd, 'wb'), tmp
+
+    def _commit_staged(self, digest: str, tmp: str) -> None:
+        path = self._path(digest)
+        if path.exists():
+            os.unlink(tmp)
+        else:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(tmp, path)
+
+    async def put_stream(self, chunks: AsyncIterator[bytes],
+                         reserve: Optional[Callable[[str], Awaitable[None]]] = None) -> str:
+        f, tmp = await asyncio.to_thread(self._open_staging)
+        sha256 = hashlib.sha256()
+        try:
+            try:
+                async for chunk in chunks:
+                    # hashlib releases the GIL on large buffers, so hash off the loop too
+                    await asyncio.to_thread(self._hash_and_write, sha256, f, chunk)
+            finally:
+                await asyncio.to_thread(f.close)
+            digest = sha256.hexdigest()
+            if reserve is not None:
+                await reserve(digest)
+            await asyncio.to_thread(self._commit_staged, digest, tmp)
+            return digest
+        except BaseException:
+            await asyncio.to_thread(Path(tmp).unlink, missing_ok=True)
+            raise
+
+    async def delete(self, digest: str) -> None:
+        await asyncio.to_thread(self._path(digest).unlink, missing_ok=True)
+
+    def _open_at(self, digest: str, start: int):
+        f = open(self._path(digest), 'rb')
+        f.seek(start)
+        return f
+
+    async def iter_chunks(self, digest: str, start: int = 0, end: Optional[int] = None,
+                          chunk_size: int = BLOB_CHUNK_SIZE) -> AsyncIterator[bytes]:
+        f = await asyncio.to_thread(self._open_at, digest, start)
+        try:
+            remaining = None if end is None else end - start
+            while remaining is None or remaining > 0:
+                size = chunk_size if remaining is None else min(chunk_size, remaining)
+                chunk = await asyncio.to_thread(f.read, size)
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+        finally:
+            await asyncio.to_thread(f.close)
+
+class GridFSBlobStore(BlobStore):
+    """Blob store backed by a MongoDB GridFS bucket"""
+
+    def __init__(self, database, bucket_name: str = "media"):
+        self.files = database[f"{bucket_name}.files"]
+        self.bucket = AsyncIOMotorGridFSBucket(database, bucket_name=bucket_name)
+
+    async def exists(self, digest: str) -> bool:
+        return await self.files.find_one({"filename": digest}, {"_id": 1}) is not None
+
+    async def size(self, digest: str) -> Optional[int]:
+        doc = await self.files.find_one({"filename": digest}, {"length": 1})
+        return doc["length"] if doc else None
+
+    async def write(self, digest: str, data: bytes) -> None:
+        await self.bucket.upload_from_stream(digest, data, metadata={"sha256": digest})
+
+    async def put_stream(self, chunks: AsyncIterator[bytes],
+                         reserve: Optional[Callable[[str], Awaitable[None]]] = None) -> str:
+        # Upload under a temporary name, then rename once the digest is known
+        grid_in = self.bucket.open_upload_stream(f"pending-{uuid.uuid4()}")
+        sha256 = hashlib.sha256()
+        try:
+            async for chunk in chunks:
+                await asyncio.to_thread(sha256.update, chunk)
+                await grid_in.write(chunk)
+        except BaseException:
+            await grid_in.abort()
+            raise
+        await grid_in.close()
+
+        digest = sha256.hexdigest()
+        if reserve is not None:
+            try:
+                await reserve(digest)
+            except BaseException:
+                await self.bucket.delete(grid_in._id)
+                raise
+        if await self.exists(digest):
+            await self.bucket.delete(grid_in._id)
+        else:
+            await self.files.update_one(
+                {"_id": grid_in._id},
+                {"$set": {"filename": digest, "metadata": {"sha256": digest}}}
+            )
+        return digest
+
+    async def delete(self, digest: str) -> None:
+        async for doc in self.files.find({"filename": digest}, {"_id": 1}):
+            await self.bucket.delete(doc["_id"])
+
+    async def iter_chunks(self, digest: str, start: int = 0, end: Optional[int] = None,
+                          chunk_size: int = BLOB_CHUNK_SIZE) -> AsyncIterator[bytes]:
+        grid_out = await self.bucket.open_download_stream_by_name(digest)
+        grid_out.seek(start)
+        remaining = None if end is None else end - start
+        while remaining is None or remaining > 0:
+            size = chunk_size if remaining is None else min(chunk_size, remaining)
+            chunk = await grid_out.read(size)
+            if not chunk:
+                break
+            if remaining is not None:
+                remaining -= len(chunk)
+            yield chunk
+
+def create_blob_store() -> BlobStore:
+    """Build the blob store selected by the BLOB_BACKEND setting"""
+    backend = os.environ.get('BLOB_BACKEND', 'gridfs')
+    if backend == 'local':
+        return LocalBlobStore(Path(os.environ.get('BLOB_DIR', ROOT_DIR / 'blobs')))
+    if backend == 'gridfs':
+        return GridFSBlobStore(db)
+    raise ValueError(f"Unknown BLOB_BACKEND: {backend}")
+
+blob_store = create_blob_store()
+
+# Deleted profiles keep a tombstone with deleted_at, which the TTL index drops
+# once the reaper has set reaped_at; every read and write on live profiles
+# filters them out
+LIVE_PROFILE = {"deleted_at": None}
+TOMBSTONE_TTL_SECONDS = int(os.environ.get('TOMBSTONE_TTL_SECONDS', 7 * 24 * 60 * 60))
+
+# Blob reference counts
+# blob_refs holds {_id: digest, refs, zero_since} for every blob a profile
+# points at. Deduplicated blobs are shared, so a blob is only collected once
+# nothing has referenced it for the grace period. The collector marks a ref
+# with collecting_since while it deletes the blob, and new references wait
+# for that to finish, so they never count a blob that is about to vanish.
+BLOB_GC_GRACE_SECONDS = int(os.environ.get('BLOB_GC_GRACE_SECONDS', 24 * 60 * 60))
+BLOB_GC_INTERVAL_SECONDS = int(os.environ.get('BLOB_GC_INTERVAL_SECONDS', 60 * 60))
+BLOB_GC_BATCH_SIZE = int(os.environ.get('BLOB_GC_BATCH_SIZE', 1000))
+# A collection still marked after this long was abandoned by a dead worker
+BLOB_COLLECT_LEASE_SECONDS = 60
+BLOB_REF_WAIT_SECONDS = 2 * BLOB_COLLECT_LEASE_SECONDS
+
+def derivative_blob_ids(derivatives: Optional[dict]) -> List[str]:
+    return [derivative["blob_id"] for derivative in (derivatives or {}).values()]
+
+def item_blob_ids(item: dict) -> List[str]:
+    """Every blob a content item references: its bytes and its derivatives"""
+    blob_ids = [item["blob_id"]] if item.get("blob_id") else []
+    return blob_ids + derivative_blob_ids(item.get("derivatives"))
+
+async def finish_blob_collection(blob_id: str, collecting_since: datetime) -> None:
+    """Delete a blob marked for collection, then its ref, unblocking new references"""
+    await blob_store.delete(blob_id)
+    await db.blob_refs.delete_one({"_id": blob_id, "collecting_since": collecting_since})
+
+async def add_blob_refs(blob_ids: List[str]) -> None:
+    """Count a new reference to each blob; call before the reference is written
+
+    Waits while the collector is deleting one of the blobs, so callers that
+    store the blob afterwards (see BlobStore.put) write it again.
+    """
+    pending = list(blob_ids)
+    deadline = time.monotonic() + BLOB_REF_WAIT_SECONDS
+    while pending:
+        try:
+            # A ref being collected doesn't match, and the upsert then collides with it
+            await db.blob_refs.bulk_write([
+                UpdateOne(
+                    {"_id": blob_id, "collecting_since": None},
+                    {"$inc": {"refs": 1}, "$unset": {"zero_since": ""}},
+                    upsert=True
+                )
+                for blob_id in pending
+            ], ordered=False)
+            return
+        except BulkWriteError as e:
+            errors = e.details.get("writeErrors", [])
+            if any(error.get("code") != 11000 for error in errors):
+                raise
+            pending = [pending[error["index"]] for error in errors]
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"Timed out waiting for blob collection of {pending[0]}")
+        stale = datetime.utcnow() - timedelta(seconds=BLOB_COLLECT_LEASE_SECONDS)
+        async for ref in db.blob_refs.find({"_id": {"$in": pending}, "collecting_since": {"$lt": stale}}):
+            await finish_blob_collection(ref["_id"], ref["collecting_since"])
+        await asyncio.sleep(0.05)
+
+async def reserve_blob(digest: str) -> None:
+    """Count a reference to a blob as it is stored; the BlobStore put reserve hook"""
+    await add_blob_refs([digest])
+
+async def release_blob_refs(blob_ids: List[str]) -> None:
+    """Drop a reference to each blob; call after the reference is removed"""
+    if not blob_ids:
+        return
+    # Blobs referenced before counting began have no entry and are kept
+    await db.blob_refs.bulk_write([
+        UpdateOne({"_id": blob_id}, {"$inc": {"refs": -1}}) for blob_id in blob_ids
+    ], ordered=False)
+    await db.blob_refs.update_many(
+        {"_id": {"$in": list(set(blob_ids))}, "refs": {"$lte": 0}, "zero_since": None},
+        {"$set": {"zero_since": datetime.utcnow()}}
+    )
+
+async def count_profile_refs(profile_id: Optional[str] = None) -> bool:
+    """Count the blobs of a profile created before blob_refs existed
+
+    Flags and reads the profile (any uncounted one without ``profile_id``)
+    in one step, returning False if there was none. Writers call this
+    before adding a reference to a profile, so a reference that was
+    counted when stored is never counted again by the backfill.
+    """
+    query = {"refs_counted": {"$ne": True}, **LIVE_PROFILE}
+    if profile_id is not None:
+        query["id"] = profile_id
+    doc = await db.user_profiles.find_one_and_update(
+        query,
+        {"$set": {"refs_counted": True}},
+        projection={"id": 1, "avatar_blob_id": 1, "avatar_derivatives": 1,
+                    "content_items.blob_id": 1, "content_items.derivatives": 1},
+        return_document=ReturnDocument.AFTER
+    )
+    if not doc:
+        return False
+    blob_ids = [doc["avatar_blob_id"]] if doc.get("avatar_blob_id") else []
+    blob_ids += derivative_blob_ids(doc.get("avatar_derivatives"))
+    for item in doc.get("content_items") or []:
+        blob_ids += item_blob_ids(item)
+    await add_blob_refs(blob_ids)
+    return True
+
+# Upload handling
+UPLOAD_CHUNK_SIZE = int(os.environ.get('UPLOAD_CHUNK_SIZE', 1024 * 1024))
+MAX_UPLOAD_BYTES = int(os.environ.get('MAX_UPLOAD_BYTES', 512 * 1024 * 1024))
+SNIFF_BYTES = 512
+
+def upload_too_large() -> HTTPException:
+    return HTTPException(
+        status_code=413,
+        detail=f"Upload exceeds the {MAX_UPLOAD_BYTES} byte limit"
+    )
+
+async def iter_upload_file(file: UploadFile, chunk_size: int = UPLOAD_CHUNK_SIZE) -> AsyncIterator[bytes]:
+    """Read an UploadFile in fixed-size chunks"""
+    while True:
+        chunk = await file.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+class UploadStream:
+    """Async iterator passing upload chunks through to storage
+
+    Tracks the total size, rejects uploads over the limit as soon as they
+    cross it and keeps the leading bytes for type sniffing.
+    """
+
+    def __init__(self, chunks: AsyncIterator[bytes], max_bytes: int = MAX_UPLOAD_BYTES):
+        self.chunks = chunks
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.head = b""
+
+    async def __aiter__(self):
+        async for chunk in self.chunks:
+            self.size += len(chunk)
+            if self.size > self.max_bytes:
+                raise upload_too_large()
+            if len(self.head) < SNIFF_BYTES:
+                self.head += chunk[:SNIFF_BYTES - len(self.head)]
+            yield chunk
+
+async def store_stream(chunks: AsyncIterator[bytes], file_name: str) -> tuple:
+    """Stream chunks into the blob store, counting a reference to the blob
+
+    Returns the blob digest, the size in bytes, and the sniffed file type
+    and MIME type.
+    """
+    stream = UploadStream(chunks)
+    blob_id = await blob_store.put_stream(stream, reserve=reserve_blob)
+    return (blob_id, stream.size) + sniff_file_type(stream.head, file_name)
+
+async def store_upload(file: UploadFile) -> tuple:
+    """Stream an UploadFile into the blob store, see store_stream"""
+    return await store_stream(iter_upload_file(file), file.filename or "")
+
+async def append_content_item(profile_id: str, content_item: ContentItem) -> bool:
+    """Atomically append an item to a profile, returning False if it is missing
+
+    The item's blobs are already counted when stored, and released again
+    if the profile is gone.
+    """
+    await count_profile_refs(profile_id)
+    # $push never rewrites existing items, so concurrent uploads can't collide
+    result = await db.user_profiles.update_one(
+        {"id": profile_id, **LIVE_PROFILE},
+        {
+            "$push": {"content_items": content_item.dict()},
+            "$set": {"updated_at": datetime.utcnow()}
+        }
+    )
+    await invalidate_profile_cache(profile_id)
+    if not result.matched_count:
+        await release_blob_refs(item_blob_ids(content_item.dict()))
+    return bool(result.matched_count)
+
+class MaxBodySizeMiddleware:
+    """Reject request bodies over the upload limit before they are parsed"""
+
+    def __init__(self, app, max_bytes: int):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length and content_length.isdigit() and int(content_length) > self.max_bytes:
+            error = upload_too_large()
+            response = JSONResponse({"detail": error.detail}, status_code=error.status_code)
+            await response(scope, receive, send)
+            return
+
+        # Bodies without a (truthful) Content-Length are counted as they stream in
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    raise upload_too_large()
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+class MetricsMiddleware:
+    """Record latency, body sizes, status codes and in-flight counts per route"""
+
+    def __init__(self, app, routes: list):
+        self.app = app
+        self.routes = routes
+
+    def route_label(self, scope) -> str:
+        # The route template, never the raw path, to keep label cardinality bounded
+        for route in self.routes:
+            match, _ = route.matches(scope)
+            if match != Match.NONE:
+                return route.path
+        return "unmatched"
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        route = self.route_label(scope)
+        method = scope["method"]
+        status_code = 500
+        request_size = 0
+        response_size = 0
+
+        async def counting_receive():
+            nonlocal request_size
+            message = await receive()
+            if message["type"] == "http.request":
+                request_size += len(message.get("body", b""))
+            return message
+
+        async def counting_send(message):
+            nonlocal status_code, response_size
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            elif message["type"] == "http.response.body":
+                response_size += len(message.get("body", b""))
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc(route=route)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, counting_receive, counting_send)
+        finally:
+            HTTP_IN_FLIGHT.dec(route=route)
+            HTTP_REQUEST_DURATION.observe(time.perf_counter() - started, method=method, route=route)
+            HTTP_REQUESTS.inc(method=method, route=route, status=status_code)
+            HTTP_REQUEST_SIZE.observe(request_size, route=route)
+            HTTP_RESPONSE_SIZE.observe(response_size, route=route)
+
+# Background jobs
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+JOB_POLL_INTERVAL = float(os.environ.get('JOB_POLL_INTERVAL', 5))
+JOB_LEASE_SECONDS = int(os.environ.get('JOB_LEASE_SECONDS', 300))
+# Succeeded and failed jobs are kept this long for /api/jobs, then expire
+JOB_RETENTION_SECONDS = int(os.environ.get('JOB_RETENTION_SECONDS', 7 * 24 * 60 * 60))
+
+# Job kind -> async handler(payload, report_progress) returning a result dict
+JOB_HANDLERS = {}
+
+_cpu_pool = None
+
+def job_handler(kind: str):
+    """Register a coroutine function as the handler for a job kind"""
+    def register(handler):
+        JOB_HANDLERS[kind] = handler
+        return handler
+    return register
+
+# Kinds of one-shot data migrations, queued by start_job_workers until they complete
+MIGRATIONS = []
+
+def migration(kind: str):
+    """Register a job handler as a one-shot migration
+
+    Completion is recorded in the migrations collection, so later startups
+    don't queue it again or rescan the collections it migrated.
+    """
+    def register(handler):
+        async def run(payload: dict, report_progress) -> dict:
+            result = await handler(payload, report_progress)
+            await db.migrations.update_one(
+                {"_id": kind},
+                {"$set": {"completed_at": datetime.utcnow(), "result": result}},
+                upsert=True
+            )
+            return result
+        JOB_HANDLERS[kind] = run
+        MIGRATIONS.append(kind)
+        return handler
+    return register
+
+async def migration_done(kind: str) -> bool:
+    return await db.migrations.find_one({"_id": kind}, {"_id": 1}) is not None
+
+async def queue_migrations() -> None:
+    """Queue every migration that hasn't completed under a fixed job id
+
+    A migration already queued or running is left alone; one whose last
+    run failed is queued again.
+    """
+    done = {doc["_id"] async for doc in db.migrations.find({"_id": {"$in": MIGRATIONS}}, {"_id": 1})}
+    for kind in MIGRATIONS:
+        if kind in done:
+            continue
+        job_id = f"migration:{kind}"
+        try:
+            await job_queue.enqueue(kind, {}, max_attempts=1, job_id=job_id)
+        except DuplicateKeyError:
+            await db.jobs.update_one({"id": job_id, "status": "failed"}, {"$set": {
+                "status": "queued",
+                "attempts": 0,
+                "error": None,
+                "finished_at": None,
+                "run_after": datetime.utcnow(),
+                "updated_at": datetime.utcnow()
+            }})
+
+def cpu_pool() -> ProcessPoolExecutor:
+    """Process pool for CPU-heavy job steps, created on first use"""
+    global _cpu_pool
+    if _cpu_pool is None:
+        # DERIVATIVE_WORKERS is the setting's older name
+        workers = os.environ.get('CPU_POOL_WORKERS') or os.environ.get('DERIVATIVE_WORKERS', 2)
+        # Forking this process would copy live Mongo client threads, so workers
+        # come from a fork server that only preloads the side-effect-free imaging module
+        context = multiprocessing.get_context("forkserver")
+        context.set_forkserver_preload(["imaging"])
+        _cpu_pool = ProcessPoolExecutor(max_workers=int(workers), mp_context=context)
+    return _cpu_pool
+
+class JobQueue:
+    """Durable job queue on the jobs collection, run by in-process workers
+
+    Workers claim jobs with a lease, so a job whose worker died is picked
+    up again once the lease expires. Failed jobs are retried with
+    exponential backoff until max_attempts.
+    """
+
+    def __init__(self, workers: int = JOB_WORKERS):
+        self.workers = workers
+        self.tasks = []
+        self.wakeup = asyncio.Event()
+
+    async def enqueue(self, kind: str, payload: dict, max_attempts: int = 3,
+                      run_after: Optional[datetime] = None, job_id: Optional[str] = None) -> Job:
+        """Queue a job; a fixed job_id makes enqueueing it twice a DuplicateKeyError"""
+        job = Job(kind=kind, payload=payload, max_attempts=max_attempts)
+        if run_after is not None:
+            job.run_after = run_after
+        if job_id is not None:
+            job.id = job_id
+        await db.jobs.insert_one(job.dict())
+        self.wakeup.set()
+        return job
+
+    def start(self) -> None:
+        self.tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+    async def claim(self) -> Optional[dict]:
+        now = datetime.utcnow()
+        return await db.jobs.find_one_and_update(
+            {"$or": [
+                {"status": "queued", "run_after": {"$lte": now}},
+                {"status": "running", "lease_expires_at": {"$lt": now}}
+            ]},
+            {
+                "$set": {
+                    "status": "running",
+                    "lease_expires_at": now + timedelta(seconds=JOB_LEASE_SECONDS),
+                    "updated_at": now
+                },
+                "$inc": {"attempts": 1}
+            },
+            sort=[("run_after", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def _work(self) -> None:
+        while True:
+            try:
+                self.wakeup.clear()
+                job = await self.claim()
+                if job is None:
+                    try:
+                        await asyncio.wait_for(self.wakeup.wait(), JOB_POLL_INTERVAL)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                await self.run(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Job worker error")
+                await asyncio.sleep(JOB_POLL_INTERVAL)
+
+    async def run(self, job: dict) -> None:
+        async def report_progress(progress: float) -> None:
+            await db.jobs.update_one(
+                {"id": job["id"]},
+                {"$set": {"progress": progress, "updated_at": datetime.utcnow()}}
+            )
+
+        handler = JOB_HANDLERS.get(job["kind"])
+        try:
+            if handler is None:
+                raise ValueError(f"No handler for job kind {job['kind']}")
+            if job["attempts"] > job["max_attempts"]:
+                raise RuntimeError("Job lease expired too many times")
+            result = await handler(job["payload"], report_progress)
+        except Exception as e:
+            logger.exception("Job %s (%s) failed", job["id"], job["kind"])
+            update = {"error": str(e), "lease_expires_at": None, "updated_at": datetime.utcnow()}
+            if job["attempts"] < job["max_attempts"] and handler is not None:
+                update["status"] = "queued"
+                update["run_after"] = datetime.utcnow() + timedelta(seconds=2 ** job["attempts"])
+            else:
+                update["status"] = "failed"
+                update["finished_at"] = datetime.utcnow()
+            await db.jobs.update_one({"id": job["id"]}, {"$set": update})
+            return
+
+        await db.jobs.update_one({"id": job["id"]}, {"$set": {
+            "status": "succeeded",
+            "progress": 1.0,
+            "result": result or {},
+            "error": None,
+            "lease_expires_at": None,
+            "finished_at": datetime.utcnow(),
+            "updated_at": datetime.utcnow()
+        }})
+
+job_queue = JobQueue()
+
+# Image derivatives
+DERIVATIVE_SIZES = (64, 256, 1024)
+DERIVATIVE_FORMAT = os.environ.get('DERIVATIVE_FORMAT', 'WEBP')
+DERIVATIVE_MEDIA_TYPES = {'WEBP': 'image/webp', 'JPEG': 'image/jpeg'}
+# Larger sources are served as-is rather than decoded
+MAX_DERIVATIVE_SOURCE_BYTES = int(os.environ.get('MAX_DERIVATIVE_SOURCE_BYTES', 50 * 1024 * 1024))
+
+def probe_image(head: bytes) -> dict:
+    """Read image dimensions from the leading bytes of a file"""
+    try:
+        with Image.open(io.BytesIO(head)) as image:
+            return {"width": image.width, "height": image.height, "format": image.format}
+    except Exception:
+        return {}
+
+async def create_derivatives(data: bytes) -> Dict[str, dict]:
+    """Render and store every derivative size of an image without blocking the loop
+
+    Each stored derivative is counted as a reference in blob_refs.
+    """
+    loop = asyncio.get_running_loop()
+    rendered = await loop.run_in_executor(
+        cpu_pool(), render_derivatives, data, DERIVATIVE_SIZES, DERIVATIVE_FORMAT
+    )
+    derivatives = {}
+    for size, encoded, width, height in rendered:
+        derivatives[str(size)] = Derivative(
+            blob_id=await blob_store.put(encoded, reserve=reserve_blob),
+            media_type=DERIVATIVE_MEDIA_TYPES[DERIVATIVE_FORMAT],
+            width=width,
+            height=height
+        ).dict()
+    return derivatives
+
+async def update_content_item(profile_id: str, item_id: str, fields: dict) -> bool:
+    """Set fields on one item of a live profile, returning False if either is gone"""
+    result = await db.user_profiles.update_one(
+        {"id": profile_id, "content_items.id": item_id, **LIVE_PROFILE},
+        {"$set": dict(
+            {f"content_items.$.{name}": value for name, value in fields.items()},
+            updated_at=datetime.utcnow()
+        )}
+    )
+    await invalidate_profile_cache(profile_id)
+    return bool(result.matched_count)
+
+@job_handler("item_derivatives")
+async def generate_item_derivatives(payload: dict, report_progress) -> dict:
+    blob_id = payload["blob_id"]
+    size = await blob_store.size(blob_id)
+    if Image is None or size is None or size > MAX_DERIVATIVE_SOURCE_BYTES:
+        return {"skipped": True}
+    derivatives = await create_derivatives(await blob_store.read(blob_id))
+    await count_profile_refs(payload["profile_id"])
+    if not await update_content_item(payload["profile_id"], payload["item_id"], {"derivatives": derivatives}):
+        await release_blob_refs(derivative_blob_ids(derivatives))
+    return {"derivatives": sorted(derivatives)}
+
+@job_handler("avatar_derivatives")
+async def generate_avatar_derivatives(payload: dict, report_progress) -> dict:
+    profile = await db.user_profiles.find_one(
+        {"id": payload["profile_id"], **LIVE_PROFILE}, {"avatar": 1, "avatar_blob_id": 1}
+    )
+    if Image is None or not profile:
+        return {"skipped": True}
+    if profile.get("avatar_blob_id"):
+        avatar = await blob_store.read(profile["avatar_blob_id"])
+    elif profile.get("avatar") and base64_decoded_size(profile["avatar"]) <= MAX_DERIVATIVE_SOURCE_BYTES:
+        # Legacy inline avatar, not yet migrated
+        with BASE64_DURATION.time(operation="decode"):
+            avatar = base64.b64decode(profile["avatar"])
+    else:
+        return {"skipped": True}
+    derivatives = await create_derivatives(avatar)
+    await count_profile_refs(payload["profile_id"])
+    result = await db.user_profiles.update_one(
+        {"id": payload["profile_id"], **LIVE_PROFILE},
+        {"$set": {"avatar_derivatives": derivatives, "updated_at": datetime.utcnow()}}
+    )
+    await invalidate_profile_cache(payload["profile_id"])
+    if not result.matched_count:
+        await release_blob_refs(derivative_blob_ids(derivatives))
+    return {"derivatives": sorted(derivatives)}
+
+@job_handler("process_upload")
+async def process_upload(payload: dict, report_progress) -> dict:
+    """Post-process a deferred upload: sniff its type, extract metadata, render derivatives"""
+    profile_id, item_id, blob_id = payload["profile_id"], payload["item_id"], payload["blob_id"]
+    head = b"".join([chunk async for chunk in blob_store.iter_chunks(blob_id, 0, 64 * 1024)])
+    file_type, mime_type = sniff_file_type(head, payload.get("file_name") or "")
+    await report_progress(0.2)
+
+    metadata = {}
+    if file_type == 'image' and Image is not None:
+        metadata = await asyncio.to_thread(probe_image, head)
+    await update_content_item(profile_id, item_id, {
+        "type": file_type,
+        "mime_type": mime_type,
+        "metadata": metadata
+    })
+    await report_progress(0.4)
+
+    if file_type == 'image':
+        await generate_item_derivatives(payload, report_progress)
+    await update_content_item(profile_id, item_id, {"status": "ready"})
+    return {"type": file_type, "mime_type": mime_type, "metadata": metadata}
+
+async def schedule_item_derivatives(profile_id: str, content_item: ContentItem) -> None:
+    if Image is not None and content_item.type == 'image' and content_item.blob_id:
+        await job_queue.enqueue("item_derivatives", {
+            "profile_id": profile_id,
+            "item_id": content_item.id,
+            "blob_id": content_item.blob_id
+        })
+
+def pick_derivative(derivatives: Optional[dict], size: Optional[int]) -> Optional[dict]:
+    """Smallest derivative at least `size` px, or None to serve the original"""
+    if not size or not derivatives:
+        return None
+    fitting = [int(key) for key in derivatives if int(key) >= size]
+    return derivatives[str(min(fitting))] if fitting else None
+
+# Response cache
+class ResponseCache:
+    """Cache of serialized JSON responses with hit/miss counters
+
+    Entries are invalidated explicitly on writes; the TTL bounds how stale
+    another worker's in-process cache can get.
+    """
+
+    backend = "none"
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, key: str) -> Optional[bytes]:
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, value: bytes) -> None:
+        pass
+
+    async def version(self, name: str) -> int:
+        """Current version of a key namespace; bumping it orphans old keys"""
+        return 0
+
+    async def bump(self, name: str) -> None:
+        pass
+
+    def stats(self) -> dict:
+        return {"backend": self.backend, "hits": self.hits, "misses": self.misses}
+
+class MemoryCache(ResponseCache):
+    """In-process LRU cache bounded by total value size in bytes"""
+
+    backend = "memory"
+
+    def __init__(self, max_bytes: int, ttl: float):
+        super().__init__()
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.entries = OrderedDict()  # key -> (expires_at, value)
+        self.size = 0
+        self.versions = {}
+
+    def _remove(self, key: str) -> None:
+        _, value = self.entries.pop(key)
+        self.size -= len(value)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        entry = self.entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                self._remove(key)
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    async def set(self, key: str, value: bytes) -> None:
+        if len(value) > self.max_bytes:
+            return
+        if key in self.entries:
+            self._remove(key)
+        self.entries[key] = (time.monotonic() + self.ttl, value)
+        self.size += len(value)
+        while self.size > self.max_bytes:
+            _, (_, evicted) = self.entries.popitem(last=False)
+            self.size -= len(evicted)
+
+    async def version(self, name: str) -> int:
+        return self.versions.get(name, 0)
+
+    async def bump(self, name: str) -> None:
+        self.versions[name] = self.versions.get(name, 0) + 1
+
+    def stats(self) -> dict:
+        return {**super().stats(), "entries": len(self.entries), "bytes": self.size, "max_bytes": self.max_bytes}
+
+class RedisCache(ResponseCache):
+    """Cache shared between workers, on any redis.asyncio-compatible client"""
+
+    backend = "redis"
+
+    def __init__(self, redis, ttl: float, prefix: str = "newlist:"):
+        super().__init__()
+        self.redis = redis
+        self.ttl = ttl
+        self.prefix = prefix
+
+    async def get(self, key: str) -> Optional[bytes]:
+        value = await self.redis.get(self.prefix + key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    async def set(self, key: str, value: bytes) -> None:
+        await self.redis.set(self.prefix + key, value, ex=int(self.ttl))
+
+    async def version(self, name: str) -> int:
+        return int(await self.redis.get(f"{self.prefix}version:{name}") or 0)
+
+    async def bump(self, name: str) -> None:
+        key = f"{self.prefix}version:{name}"
+        # Versions expire once every entry they guard has; a recreated one
+        # starts from the clock so it can't repeat a number still cached
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.set(key, int(time.time() * 1000), nx=True)
+            pipe.incr(key)
+            pipe.pexpire(key, int(self.ttl * 2 * 1000))
+            await pipe.execute()
+
+def create_response_cache() -> ResponseCache:
+    """Build the response cache selected by the CACHE_BACKEND setting"""
+    backend = os.environ.get('CACHE_BACKEND', 'memory')
+    ttl = float(os.environ.get('CACHE_TTL_SECONDS', 30))
+    if backend == 'memory':
+        return MemoryCache(int(os.environ.get('CACHE_MAX_BYTES', 64 * 1024 * 1024)), ttl)
+    if backend == 'redis':
+        if redis_asyncio is None:
+            raise RuntimeError("CACHE_BACKEND=redis requires the redis package")
+        return RedisCache(redis_asyncio.from_url(os.environ.get('REDIS_URL', 'redis://localhost:6379/0')), ttl)
+    if backend == 'none':
+        return ResponseCache()
+    raise ValueError(f"Unknown CACHE_BACKEND: {backend}")
+
+response_cache = create_response_cache()
+
+def encode_json(data: Any) -> bytes:
+    """Serialize response data the same way FastAPI's JSONResponse does"""
+    with SERIALIZATION_DURATION.time(stage="encode"):
+        if FAST_JSON:
+            # orjson handles dicts, lists and datetimes natively; models fall back
+            return orjson.dumps(data, default=jsonable_encoder)
+        return json.dumps(
+            jsonable_encoder(data),
+            ensure_ascii=False,
+            allow_nan=False,
+            separators=(",", ":")
+        ).encode('utf-8')
+
+def trusted_document(model, doc: dict) -> dict:
+    """Shape a stored document like `model` without validating it
+
+    Only for documents this app wrote; missing fields from older documents
+    get the model's defaults.
+    """
+    return {
+        name: doc.get(name) if field.is_required() else doc.get(name, field.get_default(call_default_factory=True))
+        for name, field in model.model_fields.items()
+    }
+
+def trusted_profile(doc: dict) -> dict:
+    profile = trusted_document(UserProfile, doc)
+    profile["content_items"] = [trusted_document(ContentItem, item) for item in profile["content_items"]]
+    return profile
+
+def profile_body(doc: dict) -> bytes:
+    """Encode a stored profile for a response, validating it unless FAST_JSON is on"""
+    with SERIALIZATION_DURATION.time(stage="validate"):
+        profile = trusted_profile(doc) if FAST_JSON else UserProfile(**doc)
+    return encode_json(profile)
+
+def json_body_response(body: bytes, headers: Optional[dict] = None) -> Response:
+    return Response(content=body, media_type="application/json", headers=headers)
+
+async def cache_get_tagged(key: str) -> Optional[tuple]:
+    """Fetch an (etag, body) pair stored with cache_set_tagged"""
+    value = await response_cache.get(key)
+    if value is None:
+        return None
+    etag, _, body = value.partition(b"\n")
+    return etag.decode('utf-8'), body
+
+async def cache_set_tagged(key: str, etag: str, body: bytes) -> None:
+    await response_cache.set(key, etag.encode('utf-8') + b"\n" + body)
+
+async def invalidate_profile_cache(profile_id: Optional[str] = None) -> None:
+    """Drop cached responses affected by a write to a profile"""
+    await response_cache.bump("feed")
+    if profile_id:
+        await response_cache.bump(f"profile:{profile_id}")
+
+# Avatars
+MAX_AVATAR_BYTES = int(os.environ.get('MAX_AVATAR_BYTES', 5 * 1024 * 1024))
+# Raster formats only: SVG can carry script and is never sniffed as an image
+AVATAR_MEDIA_TYPES = ('image/png', 'image/jpeg', 'image/gif', 'image/webp', 'image/bmp')
+
+def decode_avatar(avatar: str) -> tuple:
+    """Decode and validate an uploaded avatar, returning (bytes, media type)"""
+    if avatar.startswith('data:'):
+        avatar = avatar.partition(',')[2]
+    if base64_decoded_size(avatar) > MAX_AVATAR_BYTES:
+        raise HTTPException(status_code=413, detail=f"Avatar exceeds {MAX_AVATAR_BYTES} bytes")
+    try:
+        with BASE64_DURATION.time(operation="decode"):
+            data = base64.b64decode(avatar, validate=True)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Avatar is not valid base64")
+    _, media_type = sniff_file_type(data[:SNIFF_BYTES], "")
+    if media_type not in AVATAR_MEDIA_TYPES:
+        raise HTTPException(status_code=415, detail="Avatar must be a PNG, JPEG, GIF, WebP or BMP image")
+    return data, media_type
+
+def avatar_fields(profile_id: str, blob_id: str, media_type: str) -> dict:
+    """Profile fields referencing a stored avatar; the URL changes with its content"""
+    version = blob_id[:16]
+    return {
+        "avatar_blob_id": blob_id,
+        "avatar_media_type": media_type,
+        "avatar_url": f"/api/profiles/{profile_id}/avatar?v={version}",
+        "avatar_version": version,
+    }
+
+async def store_avatar(profile: UserProfile, avatar: Optional[str]) -> UserProfile:
+    """Store an uploaded avatar once in the blob store and point the profile at it"""
+    if not avatar:
+        return profile
+    data, media_type = decode_avatar(avatar)
+    blob_id = await blob_store.put(data, reserve=reserve_blob)
+    return profile.copy(update=avatar_fields(profile.id, blob_id, media_type))
+
+@migration("migrate_inline_avatars")
+async def migrate_inline_avatars(payload: dict, report_progress) -> dict:
+    """Move avatars stored inline as base64 into the blob store"""
+    migrated, invalid = 0, 0
+    async for doc in db.user_profiles.find({"avatar": {"$ne": None}, **LIVE_PROFILE}, {"id": 1, "avatar": 1}):
+        try:
+            data, media_type = decode_avatar(doc["avatar"])
+        except HTTPException:
+            # Left inline; the avatar endpoint still serves it as before
+            invalid += 1
+            continue
+        blob_id = await blob_store.put(data, reserve=reserve_blob)
+        await count_profile_refs(doc["id"])
+        result = await db.user_profiles.update_one(
+            {"id": doc["id"], "avatar": doc["avatar"], **LIVE_PROFILE},
+            {
+                "$set": dict(avatar_fields(doc["id"], blob_id, media_type), updated_at=datetime.utcnow()),
+                "$unset": {"avatar": ""}
+            }
+        )
+        await invalidate_profile_cache(doc["id"])
+        if not result.matched_count:
+            await release_blob_refs([blob_id])
+            continue
+        migrated += 1
+    return {"migrated": migrated, "invalid": invalid}
+
+# Feed cards only need counts, so content payloads never leave Mongo
+PROFILE_SUMMARY_PROJECTION = {
+    "_id": 0,
+    "id": 1,
+    "name": 1,
+    "email": 1,
+    "bio": 1,
+    "created_at": 1,
+    "updated_at": 1,
+    "avatar_url": 1,
+    "has_avatar": {"$ne": [{"$ifNull": ["$avatar", None]}, None]},
+    "content_types": {"$ifNull": ["$content_items.type", []]},
+}
+
+def normalize_name(name: str) -> str:
+    """Fold a name for prefix search: strip accents, casefold, collapse spaces"""
+    decomposed = unicodedata.normalize('NFKD', name)
+    stripped = ''.join(ch for ch in decomposed if not unicodedata.combining(ch))
+    return ' '.join(stripped.casefold().split())
+
+def profile_document(profile: UserProfile) -> dict:
+    """The stored form of a profile, with fields maintained only for queries"""
+    doc = profile.dict()
+    doc["name_normalized"] = normalize_name(profile.name)
+    # Its blobs are counted in blob_refs from the start
+    doc["refs_counted"] = True
+    return doc
+
+@migration("backfill_normalized_names")
+async def backfill_normalized_names(payload: dict, report_progress) -> dict:
+    """Add name_normalized to profiles created before prefix search existed"""
+    updated = 0
+    cursor = db.user_profiles.find({"name_normalized": {"$exists": False}, **LIVE_PROFILE}, {"id": 1, "name": 1})
+    batch = []
+    async for doc in cursor:
+        batch.append(UpdateOne({"id": doc["id"]}, {"$set": {"name_normalized": normalize_name(doc.get("name") or "")}}))
+        if len(batch) >= BULK_BATCH_SIZE:
+            updated += (await db.user_profiles.bulk_write(batch, ordered=False)).modified_count
+            batch = []
+    if batch:
+        updated += (await db.user_profiles.bulk_write(batch, ordered=False)).modified_count
+    return {"updated": updated}
+
+@migration("backfill_blob_refs")
+async def backfill_blob_refs(payload: dict, report_progress) -> dict:
+    """Count the blobs of profiles created before blob_refs existed, see count_profile_refs"""
+    counted = 0
+    while await count_profile_refs():
+        counted += 1
+    return {"profiles": counted}
+
+# Profile deletion
+REAP_BATCH_SIZE = int(os.environ.get('REAP_BATCH_SIZE', 100))
+REAP_SWEEP_INTERVAL_SECONDS = int(os.environ.get('REAP_SWEEP_INTERVAL_SECONDS', 15 * 60))
+
+# Everything but what a tombstone needs to be reported by the change feed
+TOMBSTONE_UNSET = {field: "" for field in (
+    "name", "name_normalized", "email", "bio", "avatar", "avatar_blob_id", "avatar_media_type",
+    "avatar_url", "avatar_version", "avatar_derivatives", "content_items", "refs_counted"
+)}
+
+@job_handler("reap_profile")
+async def reap_profile(payload: dict, report_progress) -> dict:
+    """Release a deleted profile's media and strip it down to a tombstone
+
+    Content items are removed REAP_BATCH_SIZE at a time, each batch pulled
+    before its blobs are released so a crash can leak a reference but never
+    drop one that is still in use. Safe to rerun.
+    """
+    profile_id = payload["profile_id"]
+    deleted = {"id": profile_id, "deleted_at": {"$ne": None}}
+    profile = await db.user_profiles.find_one(
+        deleted, {"refs_counted": 1, "avatar_blob_id": 1, "avatar_derivatives": 1}
+    )
+    if not profile:
+        return {"skipped": True}
+    counted = profile.get("refs_counted", False)
+
+    reaped = 0
+    while True:
+        batches = await db.user_profiles.aggregate([
+            {"$match": deleted},
+            {"$project": {"_id": 0, "items": {"$map": {
+                "input": {"$slice": [{"$ifNull": ["$content_items", []]}, REAP_BATCH_SIZE]},
+                "in": {"id": "$$this.id", "blob_id": "$$this.blob_id", "derivatives": "$$this.derivatives"}
+            }}}},
+        ]).to_list(1)
+        items = batches[0]["items"] if batches else []
+        if not items:
+            break
+        await db.user_profiles.update_one(
+            deleted, {"$pull": {"content_items": {"id": {"$in": [item["id"] for item in items]}}}}
+        )
+        if counted:
+            await release_blob_refs([blob_id for item in items for blob_id in item_blob_ids(item)])
+        reaped += len(items)
+
+    # updated_at is left alone: the change feed already reported the delete
+    await db.user_profiles.update_one(
+        deleted, {"$unset": TOMBSTONE_UNSET, "$set": {"reaped_at": datetime.utcnow()}}
+    )
+    if counted:
+        avatar_blob_ids = [profile["avatar_blob_id"]] if profile.get("avatar_blob_id") else []
+        await release_blob_refs(avatar_blob_ids + derivative_blob_ids(profile.get("avatar_derivatives")))
+    await invalidate_profile_cache(profile_id)
+    return {"content_items": reaped}
+
+async def schedule_periodic_job(kind: str, interval: int, delay: float = 0) -> None:
+    """Queue a maintenance job; only one is queued per interval-long slot"""
+    run_at = time.time() + delay
+    try:
+        await job_queue.enqueue(
+            kind, {}, max_attempts=1,
+            run_after=datetime.utcnow() + timedelta(seconds=delay),
+            job_id=f"{kind}:{int(run_at // interval)}"
+        )
+    except DuplicateKeyError:
+        pass
+
+@job_handler("reap_tombstones")
+async def reap_tombstones(payload: dict, report_progress) -> dict:
+    """Reap tombstones whose own reap_profile job was lost or gave up"""
+    await schedule_periodic_job("reap_tombstones", REAP_SWEEP_INTERVAL_SECONDS, REAP_SWEEP_INTERVAL_SECONDS)
+    stale = datetime.utcnow() - timedelta(seconds=REAP_SWEEP_INTERVAL_SECONDS)
+    reaped, failed = 0, 0
+    async for doc in db.user_profiles.find({"deleted_at": {"$lt": stale}, "reaped_at": None}, {"id": 1}):
+        try:
+            await reap_profile({"profile_id": doc["id"]}, report_progress)
+            reaped += 1
+        except Exception:
+            logger.exception("Could not reap profile %s", doc["id"])
+            failed += 1
+    return {"reaped": reaped, "failed": failed}
+
+@job_handler("collect_blobs")
+async def collect_blobs(payload: dict, report_progress) -> dict:
+    """Delete blobs that have been unreferenced for the whole grace period"""
+    await schedule_periodic_job("collect_blobs", BLOB_GC_INTERVAL_SECONDS, BLOB_GC_INTERVAL_SECONDS)
+    # Uncounted profiles may share a blob whose count has dropped to zero
+    if not await migration_done("backfill_blob_refs"):
+        return {"skipped": "blob_refs backfill has not finished"}
+    cutoff = datetime.utcnow() - timedelta(seconds=BLOB_GC_GRACE_SECONDS)
+    collected = 0
+    while collected < BLOB_GC_BATCH_SIZE:
+        now = datetime.utcnow()
+        # Marking the ref blocks new references until the blob is gone
+        ref = await db.blob_refs.find_one_and_update(
+            {"$or": [
+                {"refs": {"$lte": 0}, "zero_since": {"$lte": cutoff}, "collecting_since": None},
+                {"collecting_since": {"$lt": now - timedelta(seconds=BLOB_COLLECT_LEASE_SECONDS)}}
+            ]},
+            {"$set": {"collecting_since": now}},
+            return_document=ReturnDocument.AFTER
+        )
+        if not ref:
+            break
+        await finish_blob_collection(ref["_id"], ref["collecting_since"])
+        collected += 1
+    return {"collected": collected}
+
+def profile_summary(doc: dict) -> ProfileSummary:
+    """Build a ProfileSummary from a document projected for the feed"""
+    content_types = doc.get("content_types", [])
+    return ProfileSummary(
+        id=doc["id"],
+        name=doc["name"],
+        email=doc["email"],
+        bio=doc.get("bio"),
+        avatar_url=doc.get("avatar_url") or (
+            f"/api/profiles/{doc['id']}/avatar" if doc.get("has_avatar") else None
+        ),
+        content_count=len(content_types),
+        content_type_counts=Counter(content_types),
+        created_at=doc["created_at"],
+        updated_at=doc["updated_at"],
+    )
+
+# Routes
+@api_router.get("/")
+async def root():
+    return {"message": "User Profile API"}
+
+# User Profile Routes
+@api_router.post("/profiles", response_model=UserProfile)
+async def create_user_profile(profile: UserProfileCreate):
+    """Create a new user profile"""
+    try:
+        profile_dict = profile.dict()
+        profile_obj = await store_avatar(UserProfile(**profile_dict), profile.avatar)
+        
+        # Insert into database
+        result = await db.user_profiles.insert_one(profile_document(profile_obj))
+        
+        if result.inserted_id:
+            await invalidate_profile_cache()
+            if Image is not None and profile_obj.avatar_blob_id:
+                await job_queue.enqueue("avatar_derivatives", {"profile_id": profile_obj.id})
+            return profile_obj
+        else:
+            raise HTTPException(status_code=500, detail="Failed to create profile")
+    except HTTPException as he:
+        # Re-raise HTTP exceptions as-is
+        raise he
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Bulk profile import
+BULK_BATCH_SIZE = int(os.environ.get('BULK_BATCH_SIZE', 1000))
+
+def validation_error_message(error: ValidationError) -> str:
+    """Summarize a pydantic ValidationError on one line"""
+    return "; ".join(
+        f"{'.'.join(str(part) for part in err['loc']) or 'row'}: {err['msg']}"
+        for err in error.errors()
+    )
+
+async def iter_bulk_rows(request: Request) -> AsyncIterator[tuple]:
+    """Yield (row, error) pairs from a JSON array or a streamed NDJSON body"""
+    content_type = request.headers.get("content-type", "")
+    if "ndjson" in content_type or "jsonlines" in content_type:
+        buffer = b""
+        async for part in request.stream():
+            buffer += part
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                if line.strip():
+                    yield parse_json_row(line)
+        if buffer.strip():
+            yield parse_json_row(buffer)
+        return
+
+    try:
+        rows = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON")
+    if not isinstance(rows, list):
+        raise HTTPException(status_code=400, detail="Body must be a JSON array or NDJSON")
+    for row in rows:
+        yield row, None
+
+def parse_json_row(line: bytes) -> tuple:
+    try:
+        return json.loads(line), None
+    except ValueError as e:
+        return None, f"Invalid JSON: {e}"
+
+async def insert_profile_batch(batch: List[tuple]) -> List[BulkRowResult]:
+    """Insert (row index, document) pairs unordered and report each row
+
+    Avatars of rows that fail are unpinned again; inserted rows with an
+    avatar get their derivatives queued, as for a single create.
+    """
+    failed = {}
+    try:
+        await db.user_profiles.insert_many([doc for _, doc in batch], ordered=False)
+    except BulkWriteError as e:
+        for error in e.details.get("writeErrors", []):
+            failed[error["index"]] = error.get("errmsg", "Write failed")
+
+    orphaned = [doc["avatar_blob_id"] for position, (_, doc) in enumerate(batch)
+                if position in failed and doc.get("avatar_blob_id")]
+    if orphaned:
+        await release_blob_refs(orphaned)
+    if Image is not None:
+        for position, (_, doc) in enumerate(batch):
+            if position not in failed and doc.get("avatar_blob_id"):
+                await job_queue.enqueue("avatar_derivatives", {"profile_id": doc["id"]})
+    return [
+        BulkRowResult(index=index, error=failed[position]) if position in failed
+        else BulkRowResult(index=index, id=doc["id"])
+        for position, (index, doc) in enumerate(batch)
+    ]
+
+@api_router.post("/profiles/bulk", response_model=BulkCreateReport)
+async def create_user_profiles_bulk(request: Request):
+    """Create many profiles from a JSON array or an NDJSON stream
+
+    Rows are validated and written in batches with unordered insert_many;
+    a bad row is reported without failing the rest of the import.
+    """
+    try:
+        results = []
+        batch = []
+        index = 0
+        async for row, error in iter_bulk_rows(request):
+            if error is None:
+                try:
+                    create = UserProfileCreate.parse_obj(row)
+                    profile = await store_avatar(UserProfile(**create.dict()), create.avatar)
+                    batch.append((index, profile_document(profile)))
+                except ValidationError as e:
+                    error = validation_error_message(e)
+                except HTTPException as he:
+                    error = he.detail
+            if error is not None:
+                results.append(BulkRowResult(index=index, error=error))
+            index += 1
+
+            if len(batch) >= BULK_BATCH_SIZE:
+                results += await insert_profile_batch(batch)
+                batch = []
+        if batch:
+            results += await insert_profile_batch(batch)
+
+        await invalidate_profile_cache()
+        results.sort(key=lambda result: result.index)
+        failed = sum(1 for result in results if result.error)
+        return BulkCreateReport(inserted=len(results) - failed, failed=failed, results=results)
+    except HTTPException as he:
+        # Re-raise HTTP exceptions as-is
+        raise he
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Batch profile fetch
+MAX_BATCH_IDS = int(os.environ.get('MAX_BATCH_IDS', 100))
+
+@api_router.post("/profiles/batch", response_model=ProfileBatchResponse)
+async def get_user_profiles_batch(batch: ProfileBatchRequest):
+    """Fetch many profiles by id with one query
+
+    Results follow the order of ``ids`` (duplicates included), with
+    ``found: false`` for ids that don't exist. ``fields`` limits each
+    profile to those fields, plus ``id``.
+    """
+    try:
+        if len(batch.ids) > MAX_BATCH_IDS:
+            raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_IDS} ids per request")
+        if batch.fields is not None:
+            unknown = sorted(set(batch.fields) - set(UserProfile.model_fields))
+            if unknown:
+                raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+            fields = {"id", *batch.fields}
+            projection = {"_id": 0, **{field: 1 for field in fields}}
+        else:
+            fields = None
+            projection = {"_id": 0, "avatar": 0}
+
+        unique_ids = list(dict.fromkeys(batch.ids))
+        profiles = {
+            doc["id"]: doc
+            for doc in await db.user_profiles.find(
+                {"id": {"$in": unique_ids}, **LIVE_PROFILE}, projection
+            ).to_list(len(unique_ids))
+        }
+
+        with SERIALIZATION_DURATION.time(stage="validate"):
+            shaped = {}
+            for profile_id, doc in profiles.items():
+                if fields is not None:
+                    profile = trusted_profile(doc)
+                    shaped[profile_id] = {name: value for name, value in profile.items() if name in fields}
+                else:
+                    shaped[profile_id] = trusted_profile(doc) if FAST_JSON else UserProfile(**doc)
+            results = [
+                {"id": profile_id, "found": profile_id in shaped, "profile": shaped.get(profile_id)}
+                for profile_id in batch.ids
+            ]
+        return json_body_response(encode_json({"results": results}))
+    except HTTPException as he:
+        # Re-raise HTTP exceptions as-is
+        raise he
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+def feed_page_response(request: Request, etag: str, body: bytes) -> Response:
+    headers = {"ETag": etag, "Cache-Control": REVALIDATE_CACHE_CONTROL}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return not_modified(headers)
+    return json_body_response(body, headers)
+
+MAX_PROFILE_PAGE_SIZE = 100
+
+@api_router.get(
+    "/profiles",
+    response_model=Union[ProfilePage, ProfileSummaryPage, List[UserProfile], List[ProfileSummary]]
+)
+async def get_user_profiles(
+    request: Request,
+    skip: int = 0,
+    limit: int = 10,
+    cursor: Optional[str] = None,
+    view: Literal["full", "summary"] = "full"
+):
+    """Get user profiles with pagination for infinite scroll
+
+    Passing ``cursor`` (empty for the first page) switches to keyset
+    pagination and returns a page with ``next_cursor``; ``skip`` is kept
+    for older clients. ``view=summary`` returns lightweight feed cards
+    without any content payloads.
+    """
+    try:
+        # Mongo reads a limit of 0 as "no limit"
+        limit = max(1, min(limit, MAX_PROFILE_PAGE_SIZE))
+        query = {**keyset_filter(cursor), **LIVE_PROFILE}
+        if cursor is not None:
+            skip = 0
+
+        # The feed version is read first, so a write racing this read
+        # can only populate a key that is already orphaned
+        cache_key = f"feed:{await response_cache.version('feed')}:{view}:{skip}:{limit}:{cursor}"
+        cached = await cache_get_tagged(cache_key) if feed_cacheable else None
+        if cached is not None:
+            return feed_page_response(request, *cached)
+
+        if view == "summary":
+            pipeline = [{"$match": query}, {"$sort": {"created_at": -1, "id": -1}}]
+            if skip:
+                pipeline.append({"$skip": skip})
+            pipeline += [{"$limit": limit}, {"$project": PROFILE_SUMMARY_PROJECTION}]
+            profiles = await feed_db.user_profiles.aggregate(pipeline).to_list(limit)
+            with SERIALIZATION_DURATION.time(stage="validate"):
+                items = [profile_summary(profile) for profile in profiles]
+        else:
+            profiles = await feed_db.user_profiles.find(query, {"avatar": 0}).sort(
+                [("created_at", -1), ("id", -1)]
+            ).skip(skip).limit(limit).to_list(limit)
+            with SERIALIZATION_DURATION.time(stage="validate"):
+                if FAST_JSON:
+                    items = [trusted_profile(profile) for profile in profiles]
+                else:
+                    items = [UserProfile(**profile) for profile in profiles]
+
+        if cursor is None:
+            result = items
+        else:
+            next_cursor = None
+            if len(items) == limit:
+                next_cursor = encode_cursor(profiles[-1]["created_at"], profiles[-1]["id"])
+            result = {"items": items, "next_cursor": next_cursor}
+
+        body = encode_json(result)
+        etag = body_etag(body)
+        if feed_cacheable:
+            await cache_set_tagged(cache_key, etag, body)
+        return feed_page_response(request, etag, body)
+    except HTTPException as he:
+        # Re-raise HTTP exceptions as-is
+        raise he
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Profile search
+MAX_SEARCH_RESULTS = 50
+
+def text_search_pipeline(q: str, cursor: Optional[str], limit: int) -> list:
+    """Full-text matches on name, bio and content titles, best score first"""
+    pipeline = [
+        {"$match": {"$text": {"$search": q}, **LIVE_PROFILE}},
+        {"$addFields": {"score": {"$meta": "textScore"}}},
+    ]
+    if cursor:
+        score, item_id = decode_search_cursor(cursor)
+        pipeline.append({"$match": {"$or": [
+            {"score": {"$lt": score}},
+            {"score": score, "id": {"$lt": item_id}}
+        ]}})
+    return pipeline + [
+        {"$sort": {"score": -1, "id": -1}},
+        {"$limit": limit},
+        {"$project": dict(PROFILE_SUMMARY_PROJECTION, score=1)},
+    ]
+
+def prefix_search_pipeline(q: str, cursor: Optional[str], limit: int) -> list:
+    """Profiles whose normalized name starts with q, in name order"""
+    # An anchored regex on the normalized field is a bounded index scan
+    query = {"name_normalized": {"$regex": "^" + re.escape(normalize_name(q))}, **LIVE_PROFILE}
+    if cursor:
+        name, item_id = decode_search_cursor(cursor)
+        query = {"$and": [query, {"$or": [
+            {"name_normalized": {"$gt": name}},
+            {"name_normalized": name, "id": {"$gt": item_id}}
+        ]}]}
+    return [
+        {"$match": query},
+        {"$sort": {"name_normalized": 1, "id": 1}},
+        {"$limit": limit},
+        {"$project": dict(PROFILE_SUMMARY_PROJECTION, name_normalized=1)},
+    ]
+
+@api_router.get("/profiles/search", response_model=ProfileSummaryPage)
+async def search_user_profiles(
+    q: str,
+    mode: Literal["text", "prefix"] = "text",
+    cursor: Optional[str] = None,
+    limit: int = 10
+):
+    """Search profiles by name, bio and content titles
+
+    ``mode=text`` ranks full-text matches by relevance; ``mode=prefix``
+    matches the start of the name for autocomplete. Pages are chained
+    with ``next_cursor``.
+    """
+    try:
+        if not q.strip():
+            raise HTTPException(status_code=400, detail="Query must not be empty")
+        limit = max(1, min(limit, MAX_SEARCH_RESULTS))
+
+        if mode == "text":
+            pipeline, sort_field = text_search_pipeline(q, cursor, limit), "score"
+        else:
+            pipeline, sort_field = prefix_search_pipeline(q, cursor, limit), "name_normalized"
+        profiles = await db.user_profiles.aggregate(pipeline).to_list(limit)
 
-# Create the main app without a prefix
-app = FastAPI()
+        next_cursor = None
+        if len(profiles) == limit:
+            next_cursor = encode_search_cursor(profiles[-1][sort_field], profiles[-1]["id"])
+        return ProfileSummaryPage(
+            items=[profile_summary(profile) for profile in profiles],
+            next_cursor=next_cursor
+        )
+    except HTTPException as he:
+        # Re-raise HTTP exceptions as-is
+        raise he
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-# Create a router with the /api prefix
-api_router = APIRouter(prefix="/api")
+# Profile change feed
+CHANGE_FEED_MODE = os.environ.get('CHANGE_FEED_MODE', 'auto')  # 'auto', 'changestream' or 'poll'
+CHANGE_POLL_INTERVAL = float(os.environ.get('CHANGE_POLL_INTERVAL', 2))
+# updated_at is stamped by each app server before its write commits, so polls
+# stay this far behind the clock to cover commit latency and clock skew
+CHANGE_POLL_LAG_SECONDS = float(os.environ.get('CHANGE_POLL_LAG_SECONDS', 5))
+SSE_KEEPALIVE_SECONDS = 15
+MAX_CHANGE_WAIT_SECONDS = 30
+MAX_CHANGES = 500
+# Recent changes each process keeps for subscribers resuming from a token
+CHANGE_BUFFER_SIZE = int(os.environ.get('CHANGE_BUFFER_SIZE', 1000))
+# Change stream tokens remembered for resuming, including idle ones
+CHANGE_TOKEN_HISTORY = 10 * CHANGE_BUFFER_SIZE
+# A subscriber this far behind is dropped and resumes by reconnecting
+CHANGE_QUEUE_SIZE = 1000
+CHANGE_HUB_LINGER_SECONDS = float(os.environ.get('CHANGE_HUB_LINGER_SECONDS', 60))
 
-# Define Models
-class ContentItem(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    type: str  # 'text', 'image', 'audio', 'video'
-    title: str
-    content: str  # For text content or base64 encoded media
-    file_name: Optional[str] = None
-    file_size: Optional[int] = None
-    created_at: datetime = Field(default_factory=datetime.utcnow)
+# Only what a summary needs, so update lookups don't ship content payloads
+CHANGE_STREAM_PIPELINE = [
+    {"$match": {"operationType": {"$in": ["insert", "update", "replace", "delete"]}}},
+    {"$project": {
+        "operationType": 1,
+        "fullDocumentBeforeChange.id": 1,
+        **{f"fullDocument.{field}": 1 for field in (
+            "id", "name", "email", "bio", "avatar_url", "created_at", "updated_at", "deleted_at",
+            "content_items.type"
+        )},
+    }},
+]
 
-class UserProfile(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    name: str
-    email: str
-    bio: Optional[str] = None
-    avatar: Optional[str] = None  # base64 encoded image
-    content_items: List[ContentItem] = []
-    created_at: datetime = Field(default_factory=datetime.utcnow)
-    updated_at: datetime = Field(default_factory=datetime.utcnow)
+# Detected on first use: (change streams available, delete pre-images available)
+_change_stream_support = None
 
-class UserProfileCreate(BaseModel):
-    name: str
-    email: str
-    bio: Optional[str] = None
-    avatar: Optional[str] = None
+def encode_change_token(data: dict) -> str:
+    raw = json.dumps(data)
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('utf-8').rstrip('=')
 
-class ContentItemCreate(BaseModel):
-    type: str
-    title: str
-    content: str
-    file_name: Optional[str] = None
-    file_size: Optional[int] = None
+def decode_change_token(token: str) -> dict:
+    """Decode a change feed token: {"r": resume token} or {"t": updated_at, "i": id}"""
+    try:
+        data = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        if "r" in data:
+            return {"r": data["r"]}
+        return {"t": datetime.fromisoformat(data["t"]), "i": str(data["i"])}
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid change token")
 
-class StatusCheck(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    client_name: str
-    timestamp: datetime = Field(default_factory=datetime.utcnow)
+async def change_stream_support() -> tuple:
+    """Whether change streams can be used, and whether deletes carry pre-images"""
+    global _change_stream_support
+    if _change_stream_support is None:
+        if CHANGE_FEED_MODE == 'poll':
+            _change_stream_support = (False, False)
+            return _change_stream_support
+        try:
+            hello = await client.admin.command("hello")
+            supported = "setName" in hello or hello.get("msg") == "isdbgrid"
+        except Exception:
+            supported = False
+        pre_images = False
+        if supported:
+            # Pre-images (MongoDB 6+) let delete events name the profile id
+            try:
+                await db.command("collMod", "user_profiles", changeStreamPreAndPostImages={"enabled": True})
+                pre_images = True
+            except Exception as e:
+                logger.info("Change stream pre-images unavailable, deletes won't be streamed: %s", e)
+        _change_stream_support = (supported or CHANGE_FEED_MODE == 'changestream', pre_images)
+    return _change_stream_support
 
-class StatusCheckCreate(BaseModel):
-    client_name: str
+def change_from_event(event: dict) -> Optional[ProfileChange]:
+    if event["operationType"] == "delete":
+        profile_id = (event.get("fullDocumentBeforeChange") or {}).get("id")
+        return ProfileChange(op="delete", id=profile_id) if profile_id else None
+    doc = event.get("fullDocument")
+    if not doc:
+        # Deleted again before the update lookup ran
+        return None
+    if doc.get("deleted_at"):
+        # Tombstoned, or the reaper tidying a tombstone up
+        return ProfileChange(op="delete", id=doc["id"])
+    content_types = [item.get("type") for item in doc.get("content_items") or []]
+    return ProfileChange(
+        op="insert" if event["operationType"] == "insert" else "update",
+        id=doc["id"],
+        profile=profile_summary(dict(doc, content_types=content_types))
+    )
 
-# Utility functions
-def convert_file_to_base64(file_content: bytes) -> str:
-    """Convert file content to base64 string"""
-    return base64.b64encode(file_content).decode('utf-8')
+async def iter_stream_changes(resume_token: Optional[dict], pre_images: bool) -> AsyncIterator[tuple]:
+    """Yield (change, token, key) from a change stream; change is None when idle
 
-def get_file_type(filename: str) -> str:
-    """Determine file type based on extension"""
-    ext = filename.lower().split('.')[-1] if '.' in filename else ''
-    
-    image_extensions = ['jpg', 'jpeg', 'png', 'gif', 'bmp', 'webp', 'svg']
-    video_extensions = ['mp4', 'avi', 'mov', 'wmv', 'flv', 'webm']
-    audio_extensions = ['mp3', 'wav', 'flac', 'aac', 'ogg', 'm4a']
-    
-    if ext in image_extensions:
-        return 'image'
-    elif ext in video_extensions:
-        return 'video'
-    elif ext in audio_extensions:
-        return 'audio'
-    else:
-        return 'text'
+    key is the event's own resume token, the same on every stream, so an
+    event seen on two streams can be recognised; it is None when idle.
+    """
+    options = {"full_document": "updateLookup", "max_await_time_ms": 1000}
+    if pre_images:
+        options["full_document_before_change"] = "whenAvailable"
+    if resume_token:
+        options["resume_after"] = resume_token
+    async with db.user_profiles.watch(CHANGE_STREAM_PIPELINE, **options) as stream:
+        while stream.alive:
+            event = await stream.try_next()
+            token = encode_change_token({"r": stream.resume_token})
+            if event is None:
+                yield None, token, None
+            else:
+                yield change_from_event(event), token, event["_id"]["_data"]
 
-# Routes
-@api_router.get("/")
-async def root():
-    return {"message": "User Profile API"}
+def poll_start_position() -> dict:
+    """Where polling starts without a token: as far back as polls look, at a millisecond as MongoDB stores"""
+    start = datetime.utcnow() - timedelta(seconds=CHANGE_POLL_LAG_SECONDS)
+    return {"t": start.replace(microsecond=start.microsecond // 1000 * 1000), "i": ""}
 
-# User Profile Routes
-@api_router.post("/profiles", response_model=UserProfile)
-async def create_user_profile(profile: UserProfileCreate):
-    """Create a new user profile"""
+async def iter_polled_changes(since: datetime, after_id: str) -> AsyncIterator[tuple]:
+    """Yield (change, token, key) by polling updated_at; change is None when idle
+
+    key is the (updated_at, id) position, which orders changes across
+    processes. Deletes show up as tombstones until TOMBSTONE_TTL_SECONDS
+    after they are reaped.
+    """
+    while True:
+        horizon = datetime.utcnow() - timedelta(seconds=CHANGE_POLL_LAG_SECONDS)
+        profiles = await db.user_profiles.aggregate([
+            {"$match": {
+                "$or": [
+                    {"updated_at": {"$gt": since}},
+                    {"updated_at": since, "id": {"$gt": after_id}}
+                ],
+                "updated_at": {"$lte": horizon}
+            }},
+            {"$sort": {"updated_at": 1, "id": 1}},
+            {"$limit": MAX_CHANGES},
+            {"$project": dict(PROFILE_SUMMARY_PROJECTION, deleted_at=1)},
+        ]).to_list(MAX_CHANGES)
+        position = since
+        for profile in profiles:
+            since, after_id = profile["updated_at"], profile["id"]
+            token = encode_change_token({"t": since.isoformat(), "i": after_id})
+            if profile.get("deleted_at"):
+                yield ProfileChange(op="delete", id=profile["id"]), token, (since, after_id)
+                continue
+            op = "insert" if profile["created_at"] > position else "update"
+            yield ProfileChange(op=op, id=profile["id"], profile=profile_summary(profile)), token, (since, after_id)
+        if len(profiles) < MAX_CHANGES:
+            yield None, encode_change_token({"t": since.isoformat(), "i": after_id}), (since, after_id)
+            await asyncio.sleep(CHANGE_POLL_INTERVAL)
+
+class ChangeSubscription:
+    """One reader of the ChangeHub, fed through its own bounded queue"""
+
+    def __init__(self):
+        self.queue = asyncio.Queue(maxsize=CHANGE_QUEUE_SIZE)
+        self.dropped = False
+        self.error = None
+
+    def push(self, entry: tuple) -> bool:
+        """Queue an entry, returning False if the reader fell too far behind"""
+        try:
+            self.queue.put_nowait(entry)
+            return True
+        except asyncio.QueueFull:
+            self.dropped = True
+            return False
+
+    def fail(self, error: Exception) -> None:
+        self.error = error
+        try:
+            self.queue.put_nowait(None)  # Wakes a waiting reader
+        except asyncio.QueueFull:
+            pass
+
+    async def next(self) -> Optional[tuple]:
+        """The next (seq, change, token, key) entry, or None once dropped"""
+        while True:
+            if self.queue.empty():
+                if self.error is not None:
+                    raise self.error
+                if self.dropped:
+                    return None
+            entry = await self.queue.get()
+            if entry is not None:
+                return entry
+
+class ChangeHub:
+    """One change stream or poller per process, fanned out to subscriber queues
+
+    Recent changes are buffered, so SSE reconnects and JSON long-polls
+    resuming from a recent token replay them from memory. Older tokens
+    are caught up from MongoDB once and then joined to the shared feed.
+    The source stops CHANGE_HUB_LINGER_SECONDS after its last subscriber.
+    """
+
+    def __init__(self):
+        self.subscribers = set()
+        self.task = None
+        self.loop = None
+        self.stop_handle = None
+        self._reset()
+
+    def _reset(self) -> None:
+        self.seq = 0
+        self.token = None
+        self.key = None
+        self.buffer = deque(maxlen=CHANGE_BUFFER_SIZE)  # (seq, change, token, key) of changes only
+        # Change streams: tokens handed out -> seq, valid while no later change was evicted
+        self.positions = OrderedDict()
+        self.evicted_seq = 0
+        # Polling: the buffer holds every change after this key
+        self.floor = None
+        self.ready = asyncio.Event()
+
+    def _start(self, streams: bool, pre_images: bool) -> None:
+        loop = asyncio.get_running_loop()
+        if self.loop is not loop:
+            # Nothing started on another event loop carries over
+            self.loop, self.task, self.stop_handle = loop, None, None
+            self.subscribers.clear()
+            self._reset()
+        if self.stop_handle is not None:
+            self.stop_handle.cancel()
+            self.stop_handle = None
+        if self.task is None:
+            self.task = loop.create_task(self._run(streams, pre_images))
+
+    def _stop(self) -> None:
+        self.stop_handle = None
+        if self.subscribers or self.task is None:
+            return
+        task, self.task = self.task, None
+        task.cancel()
+        self._reset()
+
+    async def stop(self) -> None:
+        if self.task is not None:
+            task, self.task = self.task, None
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+    async def _run(self, streams: bool, pre_images: bool) -> None:
+        try:
+            if streams:
+                source = iter_stream_changes(None, pre_images)
+            else:
+                position = poll_start_position()
+                self.floor = (position["t"], position["i"])
+                source = iter_polled_changes(position["t"], position["i"])
+            async with aclosing(source):
+                async for change, token, key in source:
+                    self._publish(change, token, key, streams)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.exception("Change feed source failed")
+            # Waiting subscribers see the error instead of the first token
+            ready = self.ready
+            for subscriber in self.subscribers:
+                subscriber.fail(e)
+            self.subscribers.clear()
+            if self.task is asyncio.current_task():
+                self.task = None
+                self._reset()
+            ready.set()
+
+    def _publish(self, change: Optional[ProfileChange], token: str, key, streams: bool) -> None:
+        self.seq += 1
+        self.token, self.key = token, key
+        entry = (self.seq, change, token, key)
+        if change is not None:
+            if len(self.buffer) == self.buffer.maxlen:
+                evicted = self.buffer[0]
+                self.evicted_seq, self.floor = evicted[0], (None if streams else evicted[3])
+            self.buffer.append(entry)
+        if streams:
+            self.positions[token] = self.seq
+            if len(self.positions) > CHANGE_TOKEN_HISTORY:
+                self.positions.popitem(last=False)
+        self.ready.set()
+        for subscriber in list(self.subscribers):
+            if not subscriber.push(entry):
+                self.subscribers.discard(subscriber)
+
+    async def subscribe(self, since: Optional[str], streams: bool, pre_images: bool) -> AsyncIterator[tuple]:
+        """Yield (change, token) after ``since``, or from now; change is None when idle"""
+        subscriber = ChangeSubscription()
+        self._start(streams, pre_images)
+        self.subscribers.add(subscriber)
+        try:
+            await self.ready.wait()
+            if subscriber.error is not None:
+                raise subscriber.error
+            follow = self._follow_stream if streams else self._follow_polls
+            async with aclosing(follow(subscriber, since, pre_images)) as changes:
+                async for item in changes:
+                    yield item
+        finally:
+            self.subscribers.discard(subscriber)
+            if not self.subscribers and self.task is not None and self.stop_handle is None:
+                self.stop_handle = self.loop.call_later(CHANGE_HUB_LINGER_SECONDS, self._stop)
+
+    async def _follow_stream(self, subscriber: ChangeSubscription, since: Optional[str],
+                             pre_images: bool) -> AsyncIterator[tuple]:
+        seen, last_token = set(), since or self.token
+        start = self.seq if since is None else self.positions.get(since)
+        if start is not None and start >= self.evicted_seq:
+            replay = [entry for entry in self.buffer if entry[0] > start]
+            after = self.seq
+            for _, change, token, _ in replay:
+                last_token = token
+                yield change, token
+        else:
+            # Not recent here: catch up on a stream of our own until it idles,
+            # then skip the events the shared stream also delivers
+            after = 0
+            catch_up = iter_stream_changes(decode_change_token(since)["r"], pre_images)
+            async with aclosing(catch_up):
+                async for change, token, key in catch_up:
+                    if key is None:
+                        break
+                    seen.add(key)
+                    last_token = token
+                    if change is not None:
+                        yield change, token
+        yield None, last_token
+
+        while True:
+            entry = await subscriber.next()
+            if entry is None:
+                return
+            seq, change, token, key = entry
+            if seq <= after:
+                continue
+            if seen:
+                if key in seen:
+                    continue
+                if key is None:
+                    # The shared stream may still be behind what was caught up
+                    yield None, last_token
+                    continue
+                seen.clear()
+            last_token = token
+            yield change, token
+
+    async def _follow_polls(self, subscriber: ChangeSubscription, since: Optional[str],
+                            pre_images: bool) -> AsyncIterator[tuple]:
+        if since is None:
+            position, last_token = self.key, self.token
+        else:
+            decoded = decode_change_token(since)
+            position, last_token = (decoded["t"], decoded["i"]), since
+        if self.floor is not None and position >= self.floor:
+            for _, change, token, key in [entry for entry in self.buffer if entry[3] > position]:
+                position, last_token = key, token
+                yield change, token
+        else:
+            # Older than the buffer: poll once from the token up to now
+            catch_up = iter_polled_changes(*position)
+            async with aclosing(catch_up):
+                async for change, token, key in catch_up:
+                    position, last_token = key, token
+                    if change is None:
+                        break
+                    yield change, token
+        yield None, last_token
+
+        while True:
+            entry = await subscriber.next()
+            if entry is None:
+                return
+            _, change, token, key = entry
+            if change is None or key <= position:
+                if change is None:
+                    yield None, last_token
+                continue
+            position, last_token = key, token
+            yield change, token
+
+change_hub = ChangeHub()
+
+async def iter_profile_changes(since: Optional[str]) -> AsyncIterator[tuple]:
+    """Changes after a token, or from now without one, from this process's ChangeHub"""
+    position = decode_change_token(since) if since else None
+    streams, pre_images = await change_stream_support()
+    if position is not None and "r" in position and not streams:
+        raise HTTPException(status_code=400, detail="Change streams are not available")
+    if position is not None and "r" not in position and streams:
+        raise HTTPException(status_code=410, detail="Polling change tokens can't resume a change stream")
+    async with aclosing(change_hub.subscribe(since, streams, pre_images)) as changes:
+        async for item in changes:
+            yield item
+
+def sse_event(event: str, data: str, event_id: Optional[str] = None) -> bytes:
+    lines = f"id: {event_id}\n" if event_id else ""
+    return f"{lines}event: {event}\ndata: {data}\n\n".encode('utf-8')
+
+async def iter_change_events(since: Optional[str]) -> AsyncIterator[bytes]:
+    """Server-Sent Events for profile changes, with keepalives while idle"""
+    last_sent = time.monotonic()
+    ready = False
     try:
-        profile_dict = profile.dict()
-        profile_obj = UserProfile(**profile_dict)
-        
-        # Insert into database
-        result = await db.user_profiles.insert_one(profile_obj.dict())
-        
-        if result.inserted_id:
-            return profile_obj
+        async with aclosing(iter_profile_changes(since)) as changes:
+            async for change, token in changes:
+                if change is not None:
+                    yield sse_event("change", change.json(), token)
+                elif not ready:
+                    # Lets clients resume from here even if nothing changes
+                    yield sse_event("ready", "{}", token)
+                    ready = True
+                elif time.monotonic() - last_sent >= SSE_KEEPALIVE_SECONDS:
+                    yield b": keepalive\n\n"
+                else:
+                    continue
+                last_sent = time.monotonic()
+    except OperationFailure as e:
+        # e.g. the resume token fell off the oplog; the client must resync
+        yield sse_event("error", json.dumps({"detail": str(e)}))
+    except HTTPException as he:
+        yield sse_event("error", json.dumps({"detail": he.detail}))
+
+@api_router.get("/profiles/changes", response_model=ProfileChangePage)
+async def get_profile_changes(
+    request: Request,
+    since: Optional[str] = None,
+    format: Literal["json", "sse"] = "json",
+    wait: float = 0,
+    limit: int = 100
+):
+    """Profiles inserted, updated or deleted after the ``since`` token
+
+    Without ``since`` the feed starts from now. ``format=json`` returns one
+    page, long-polling up to ``wait`` seconds when there is nothing new;
+    ``format=sse`` streams Server-Sent Events and resumes from
+    Last-Event-ID on reconnect. Change streams are used when MongoDB runs
+    as a replica set; otherwise updated_at is polled, which only sees
+    deletes while their tombstones last.
+    """
+    try:
+        since = since or request.headers.get("last-event-id")
+        if format == "sse":
+            if since:
+                decode_change_token(since)
+            return StreamingResponse(
+                iter_change_events(since),
+                media_type="text/event-stream",
+                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+            )
+
+        limit = max(1, min(limit, MAX_CHANGES))
+        deadline = time.monotonic() + max(0, min(wait, MAX_CHANGE_WAIT_SECONDS))
+        changes, next_token = [], since
+        async with aclosing(iter_profile_changes(since)) as feed:
+            async for change, token in feed:
+                next_token = token
+                if change is not None:
+                    changes.append(change)
+                    if len(changes) >= limit:
+                        break
+                elif changes or time.monotonic() >= deadline:
+                    break
+        return ProfileChangePage(changes=changes, next_token=next_token)
+    except HTTPException as he:
+        # Re-raise HTTP exceptions as-is
+        raise he
+    except OperationFailure as e:
+        raise HTTPException(status_code=410, detail=f"Change token can no longer be resumed: {e}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@api_router.get("/profiles/{profile_id}", response_model=UserProfile)
+async def get_user_profile(profile_id: str, request: Request):
+    """Get a specific user profile, answering 304 when the client's copy is current"""
+    try:
+        # Versioned like the feed, so a read racing a write can't cache the old body
+        cache_key = f"profile:{profile_id}:{await response_cache.version(f'profile:{profile_id}')}"
+        if_none_match = request.headers.get("if-none-match")
+        cached = await cache_get_tagged(cache_key)
+        if cached is None and if_none_match:
+            # Revalidate against updated_at alone so the document isn't loaded
+            stamp = await db.user_profiles.find_one({"id": profile_id, **LIVE_PROFILE}, {"_id": 0, "updated_at": 1})
+            if stamp:
+                etag = profile_etag(profile_id, stamp["updated_at"])
+                if etag_matches(if_none_match, etag):
+                    return not_modified({"ETag": etag, "Cache-Control": REVALIDATE_CACHE_CONTROL})
+
+        if cached is None:
+            profile = await db.user_profiles.find_one({"id": profile_id, **LIVE_PROFILE}, {"avatar": 0})
+            if not profile:
+                raise HTTPException(status_code=404, detail="Profile not found")
+            etag = profile_etag(profile_id, profile["updated_at"])
+            body = profile_body(profile)
+            await cache_set_tagged(cache_key, etag, body)
         else:
-            raise HTTPException(status_code=500, detail="Failed to create profile")
+            etag, body = cached
+
+        headers = {"ETag": etag, "Cache-Control": REVALIDATE_CACHE_CONTROL}
+        if etag_matches(if_none_match, etag):
+            return not_modified(headers)
+        return json_body_response(body, headers)
+    except HTTPException as he:
+        # Re-raise HTTP exceptions as-is
+        raise he
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@api_router.get("/profiles", response_model=List[UserProfile])
-async def get_user_profiles(skip: int = 0, limit: int = 10):
-    """Get user profiles with pagination for infinite scroll"""
+@api_router.get("/profiles/{profile_id}/avatar")
+async def get_profile_avatar(
+    profile_id: str,
+    request: Request,
+    size: Optional[int] = None,
+    v: Optional[str] = None
+):
+    """Serve a profile's avatar image, resized when ``size`` is given
+
+    Requests for the current version (``v`` from the profile's avatar_url)
+    are cacheable forever, since a new avatar gets a new URL.
+    """
     try:
-        profiles = await db.user_profiles.find().skip(skip).limit(limit).sort("created_at", -1).to_list(limit)
-        return [UserProfile(**profile) for profile in profiles]
+        stamp = await db.user_profiles.find_one(
+            {"id": profile_id, "$or": [{"avatar_blob_id": {"$ne": None}}, {"avatar": {"$ne": None}}], **LIVE_PROFILE},
+            {"_id": 0, "updated_at": 1, "avatar_blob_id": 1, "avatar_media_type": 1,
+             "avatar_version": 1, "avatar_derivatives": 1}
+        )
+        if not stamp:
+            raise HTTPException(status_code=404, detail="Avatar not found")
+
+        blob_id, media_type = stamp.get("avatar_blob_id"), stamp.get("avatar_media_type")
+        derivative = pick_derivative(stamp.get("avatar_derivatives"), size)
+        if derivative:
+            blob_id, media_type = derivative["blob_id"], derivative["media_type"]
+        versioned = v is not None and v == stamp.get("avatar_version")
+        headers = {
+            "ETag": f'"{blob_id}"' if blob_id else profile_etag(profile_id, stamp["updated_at"]),
+            "Last-Modified": format_http_date(stamp["updated_at"]),
+            "Cache-Control": MEDIA_CACHE_CONTROL if versioned else REVALIDATE_CACHE_CONTROL,
+        }
+        if not_modified_since(request, headers["ETag"], stamp["updated_at"]):
+            return not_modified(headers)
+        if blob_id:
+            length = await blob_store.size(blob_id)
+            if length is None:
+                raise HTTPException(status_code=404, detail="Avatar not found")
+            headers["Content-Length"] = str(length)
+            return StreamingResponse(blob_store.iter_chunks(blob_id), media_type=media_type, headers=headers)
+
+        # Legacy inline avatar, not yet migrated to the blob store
+        profile = await db.user_profiles.find_one({"id": profile_id, **LIVE_PROFILE}, {"avatar": 1})
+        if not profile or not profile.get("avatar"):
+            raise HTTPException(status_code=404, detail="Avatar not found")
+        avatar = profile["avatar"]
+        return StreamingResponse(
+            iter_base64_range(avatar, 0, base64_decoded_size(avatar)),
+            media_type=DEFAULT_MEDIA_TYPES['image'],
+            headers=headers
+        )
+    except HTTPException as he:
+        # Re-raise HTTP exceptions as-is
+        raise he
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@api_router.get("/profiles/{profile_id}", response_model=UserProfile)
-async def get_user_profile(profile_id: str):
-    """Get a specific user profile"""
+MAX_CONTENT_PAGE_SIZE = 100
+
+@api_router.get("/profiles/{profile_id}/content", response_model=ContentItemPage)
+async def get_profile_content(
+    profile_id: str,
+    cursor: Optional[str] = None,
+    limit: int = 20,
+    type: Optional[str] = None,
+    include_content: bool = False
+):
+    """Page through a profile's content items in upload order
+
+    Only item metadata is returned unless ``include_content`` is set;
+    bodies can be fetched lazily from the per-item raw endpoint.
+    """
     try:
-        profile = await db.user_profiles.find_one({"id": profile_id})
-        if profile:
-            return UserProfile(**profile)
-        else:
+        limit = max(1, min(limit, MAX_CONTENT_PAGE_SIZE))
+        items = {"$ifNull": ["$content_items", []]}
+        if type:
+            items = {"$filter": {"input": items, "as": "item", "cond": {"$eq": ["$$item.type", type]}}}
+        offset = decode_offset_cursor(cursor) if cursor else 0
+
+        # Fetch one extra item to know whether another page exists
+        pipeline = [
+            {"$match": {"id": profile_id, **LIVE_PROFILE}},
+            {"$project": {"_id": 0, "items": {"$slice": [items, offset, limit + 1]}}}
+        ]
+        if not include_content:
+            pipeline.append({"$project": {"items.content": 0}})
+
+        profiles = await db.user_profiles.aggregate(pipeline).to_list(1)
+        if not profiles:
             raise HTTPException(status_code=404, detail="Profile not found")
+
+        page = profiles[0]["items"]
+        next_cursor = None
+        if len(page) > limit:
+            page = page[:limit]
+            next_cursor = encode_offset_cursor(offset + limit)
+        if FAST_JSON:
+            items = [trusted_document(ContentItemMeta, item) for item in page]
+            return json_body_response(encode_json({"items": items, "next_cursor": next_cursor}))
+        return ContentItemPage(items=[ContentItemMeta(**item) for item in page], next_cursor=next_cursor)
     except HTTPException as he:
         # Re-raise HTTP exceptions as-is
         raise he
@@ -143,28 +3028,76 @@ async def add_content_to_profile(
     title: str = Form(...),
     content_type: str = Form(...),
     text_content: Optional[str] = Form(None),
-    file: Optional[UploadFile] = File(None)
+    file: Optional[UploadFile] = File(None),
+    blob_id: Optional[str] = Form(None),
+    file_name: Optional[str] = Form(None),
+    defer: bool = False
 ):
-    """Add content to a user profile"""
+    """Add content to a user profile
+
+    With ``defer`` a file upload is only stored before responding 202; type
+    sniffing, metadata and derivatives run as a job reported at /api/jobs.
+    ``blob_id`` attaches a blob already stored through /api/upload instead.
+    """
     try:
-        # Find the profile
-        profile = await db.user_profiles.find_one({"id": profile_id})
-        if not profile:
-            raise HTTPException(status_code=404, detail="Profile not found")
-        
         # Process content
-        if file:
-            # Handle file upload
-            file_content = await file.read()
-            file_type = get_file_type(file.filename)
-            base64_content = convert_file_to_base64(file_content)
+        if file and defer:
+            stream = UploadStream(iter_upload_file(file))
+            content_item = ContentItem(
+                type=get_file_type(file.filename or ""),
+                title=title,
+                content="",
+                blob_id=await blob_store.put_stream(stream, reserve=reserve_blob),
+                file_name=file.filename,
+                file_size=stream.size,
+                status="processing"
+            )
+            if not await append_content_item(profile_id, content_item):
+                raise HTTPException(status_code=404, detail="Profile not found")
+            job = await job_queue.enqueue("process_upload", {
+                "profile_id": profile_id,
+                "item_id": content_item.id,
+                "blob_id": content_item.blob_id,
+                "file_name": file.filename
+            })
+            return JSONResponse(status_code=202, content=jsonable_encoder({
+                "message": "Content accepted for processing",
+                "content_item": content_item,
+                "job_id": job.id
+            }))
+        elif file:
+            # Stream the upload into blob storage chunk by chunk
+            blob_id, file_size, file_type, mime_type = await store_upload(file)
             
             content_item = ContentItem(
                 type=file_type,
+                mime_type=mime_type,
                 title=title,
-                content=base64_content,
+                content="",
+                blob_id=blob_id,
                 file_name=file.filename,
-                file_size=len(file_content)
+                file_size=file_size
+            )
+        elif blob_id:
+            if not is_blob_digest(blob_id):
+                raise HTTPException(status_code=400, detail="Invalid blob_id")
+            # Pin first so the collector can't remove the blob after the check
+            await add_blob_refs([blob_id])
+            file_size = await blob_store.size(blob_id)
+            if file_size is None:
+                await release_blob_refs([blob_id])
+                raise HTTPException(status_code=404, detail="Blob not found")
+            head = b"".join([chunk async for chunk in blob_store.iter_chunks(blob_id, 0, 64 * 1024)])
+            file_type, mime_type = sniff_file_type(head, file_name or "")
+
+            content_item = ContentItem(
+                type=file_type,
+                mime_type=mime_type,
+                title=title,
+                content="",
+                blob_id=blob_id,
+                file_name=file_name,
+                file_size=file_size
             )
         else:
             # Handle text content
@@ -174,16 +3107,9 @@ async def add_content_to_profile(
                 content=text_content or ""
             )
         
-        # Add content to profile
-        profile_obj = UserProfile(**profile)
-        profile_obj.content_items.append(content_item)
-        profile_obj.updated_at = datetime.utcnow()
-        
-        # Update in database
-        await db.user_profiles.update_one(
-            {"id": profile_id},
-            {"$set": profile_obj.dict()}
-        )
+        if not await append_content_item(profile_id, content_item):
+            raise HTTPException(status_code=404, detail="Profile not found")
+        await schedule_item_derivatives(profile_id, content_item)
         
         return {"message": "Content added successfully", "content_item": content_item}
     except HTTPException as he:
@@ -192,12 +3118,92 @@ async def add_content_to_profile(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@api_router.get("/profiles/{profile_id}/content/{item_id}/raw")
+async def get_content_media(profile_id: str, item_id: str, request: Request, size: Optional[int] = None):
+    """Stream the raw bytes of a content item, honoring single byte ranges
+
+    ``size`` selects the smallest generated image derivative covering it,
+    falling back to the original.
+    """
+    try:
+        profile = await db.user_profiles.find_one(
+            {"id": profile_id, **LIVE_PROFILE},
+            {"content_items": {"$elemMatch": {"id": item_id}}}
+        )
+        if not profile or not profile.get("content_items"):
+            raise HTTPException(status_code=404, detail="Content item not found")
+
+        item = profile["content_items"][0]
+        blob_id = item.get("blob_id")
+        media_type = media_type_for(item)
+        derivative = pick_derivative(item.get("derivatives"), size)
+        if derivative:
+            blob_id, media_type = derivative["blob_id"], derivative["media_type"]
+
+        if blob_id:
+            length = await blob_store.size(blob_id)
+            if length is None:
+                raise HTTPException(status_code=404, detail="Media not found")
+            etag = f'"{blob_id}"'
+        elif stored_as_base64(item) and item.get("content"):
+            length = base64_decoded_size(item["content"])
+            etag = f'"{item["id"]}"'
+        elif not stored_as_base64(item):
+            text = (item.get("content") or "").encode('utf-8')
+            length = len(text)
+            etag = f'"{item["id"]}"'
+        else:
+            raise HTTPException(status_code=404, detail="Media not found")
+
+        headers = {
+            "Accept-Ranges": "bytes",
+            "ETag": etag,
+            "Last-Modified": format_http_date(item["created_at"]),
+            "Cache-Control": MEDIA_CACHE_CONTROL,
+            **media_security_headers(media_type, item.get("file_name")),
+        }
+        if not_modified_since(request, etag, item["created_at"]):
+            return not_modified(headers)
+
+        byte_range = parse_range_header(request.headers.get("range"), length)
+        if byte_range:
+            start, end = byte_range
+            headers["Content-Range"] = f"bytes {start}-{end - 1}/{length}"
+            status_code = 206
+        else:
+            start, end = 0, length
+            status_code = 200
+        headers["Content-Length"] = str(end - start)
+
+        if blob_id:
+            body = blob_store.iter_chunks(blob_id, start, end)
+        elif stored_as_base64(item):
+            body = iter_base64_range(item["content"], start, end)
+        else:
+            body = iter([text[start:end]])
+        return StreamingResponse(body, status_code=status_code, media_type=media_type, headers=headers)
+    except HTTPException as he:
+        # Re-raise HTTP exceptions as-is
+        raise he
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @api_router.delete("/profiles/{profile_id}")
 async def delete_user_profile(profile_id: str):
-    """Delete a user profile"""
+    """Delete a user profile
+
+    The profile is tombstoned, which hides it from every read at once; its
+    content and media are released afterwards by a reap_profile job.
+    """
     try:
-        result = await db.user_profiles.delete_one({"id": profile_id})
-        if result.deleted_count:
+        now = datetime.utcnow()
+        result = await db.user_profiles.update_one(
+            {"id": profile_id, **LIVE_PROFILE},
+            {"$set": {"deleted_at": now, "updated_at": now}}
+        )
+        await invalidate_profile_cache(profile_id)
+        if result.matched_count:
+            await job_queue.enqueue("reap_profile", {"profile_id": profile_id})
             return {"message": "Profile deleted successfully"}
         else:
             raise HTTPException(status_code=404, detail="Profile not found")
@@ -210,26 +3216,203 @@ async def delete_user_profile(profile_id: str):
 # File upload route for chunked uploads
 @api_router.post("/upload")
 async def upload_file(file: UploadFile = File(...)):
-    """Handle file upload and return base64 encoded content"""
+    """Stream an uploaded file into blob storage and return its reference
+
+    Attach the returned ``blob_id`` to a profile with the ``blob_id`` field
+    of /profiles/{profile_id}/content; unattached blobs are collected.
+    """
     try:
-        # Read file content
-        file_content = await file.read()
-        
-        # Convert to base64
-        base64_content = convert_file_to_base64(file_content)
-        
-        # Determine file type
-        file_type = get_file_type(file.filename)
+        blob_id, file_size, file_type, mime_type = await store_upload(file)
+        # Nothing references the blob yet, so it's collected after the grace period
+        await release_blob_refs([blob_id])
         
         return {
             "filename": file.filename,
             "file_type": file_type,
-            "file_size": len(file_content),
-            "content": base64_content
+            "mime_type": mime_type,
+            "file_size": file_size,
+            "blob_id": blob_id
         }
+    except HTTPException as he:
+        # Re-raise HTTP exceptions as-is
+        raise he
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Resumable upload sessions
+MAX_UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024  # Chunks are stored as single documents
+UPLOAD_SESSION_TTL = int(os.environ.get('UPLOAD_SESSION_TTL', 24 * 60 * 60))
+
+def upload_session_response(session: dict) -> UploadSession:
+    """Build the API view of an upload session, merging chunks into byte ranges"""
+    ranges = []
+    for index in sorted(session.get("received_chunks", [])):
+        start = index * session["chunk_size"]
+        end = min(start + session["chunk_size"], session["file_size"])
+        if ranges and ranges[-1][1] == start:
+            ranges[-1][1] = end
+        else:
+            ranges.append([start, end])
+    return UploadSession(**{**session, "received_ranges": ranges})
+
+async def iter_session_chunks(session: dict) -> AsyncIterator[bytes]:
+    """Yield a session's stored chunks in order, one document at a time"""
+    for index in range(session["chunk_count"]):
+        chunk = await db.upload_chunks.find_one({"session_id": session["id"], "index": index})
+        yield chunk["data"]
+
+@api_router.post("/upload/sessions", response_model=UploadSession)
+async def create_upload_session(input: UploadSessionCreate):
+    """Start a resumable upload that is sent as numbered chunks"""
+    try:
+        chunk_size = input.chunk_size or UPLOAD_CHUNK_SIZE
+        if not 0 < chunk_size <= MAX_UPLOAD_CHUNK_SIZE:
+            raise HTTPException(status_code=400, detail=f"chunk_size must be between 1 and {MAX_UPLOAD_CHUNK_SIZE}")
+        if input.file_size <= 0:
+            raise HTTPException(status_code=400, detail="file_size must be positive")
+        if input.file_size > MAX_UPLOAD_BYTES:
+            raise upload_too_large()
+        if not await db.user_profiles.find_one({"id": input.profile_id, **LIVE_PROFILE}, {"_id": 1}):
+            raise HTTPException(status_code=404, detail="Profile not found")
+
+        session = UploadSession(
+            **input.dict(exclude={"chunk_size"}),
+            chunk_size=chunk_size,
+            chunk_count=-(-input.file_size // chunk_size)
+        )
+        await db.upload_sessions.insert_one(session.dict(exclude={"received_ranges"}))
+        return session
+    except HTTPException as he:
+        # Re-raise HTTP exceptions as-is
+        raise he
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@api_router.get("/upload/sessions/{session_id}", response_model=UploadSession)
+async def get_upload_session(session_id: str):
+    """Report which chunks and byte ranges of an upload have been received"""
+    try:
+        session = await db.upload_sessions.find_one({"id": session_id})
+        if not session:
+            raise HTTPException(status_code=404, detail="Upload session not found")
+        return upload_session_response(session)
+    except HTTPException as he:
+        # Re-raise HTTP exceptions as-is
+        raise he
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@api_router.put("/upload/sessions/{session_id}/chunks/{index}", response_model=UploadSession)
+async def put_upload_chunk(session_id: str, index: int, request: Request):
+    """Store one chunk of an upload; chunks may arrive in any order or be retried"""
+    try:
+        session = await db.upload_sessions.find_one({"id": session_id})
+        if not session:
+            raise HTTPException(status_code=404, detail="Upload session not found")
+        if session["status"] != "pending":
+            raise HTTPException(status_code=409, detail="Upload session is already finalized")
+        if not 0 <= index < session["chunk_count"]:
+            raise HTTPException(status_code=400, detail="Chunk index out of range")
+
+        expected = min(session["chunk_size"], session["file_size"] - index * session["chunk_size"])
+        data = bytearray()
+        async for part in request.stream():
+            data += part
+            if len(data) > expected:
+                raise HTTPException(status_code=400, detail=f"Chunk {index} must be {expected} bytes")
+        if len(data) != expected:
+            raise HTTPException(status_code=400, detail=f"Chunk {index} must be {expected} bytes")
+
+        await db.upload_chunks.update_one(
+            {"session_id": session_id, "index": index},
+            {"$set": {"data": bytes(data), "created_at": datetime.utcnow()}},
+            upsert=True
+        )
+        session = await db.upload_sessions.find_one_and_update(
+            {"id": session_id},
+            {"$addToSet": {"received_chunks": index}},
+            return_document=ReturnDocument.AFTER
+        )
+        return upload_session_response(session)
+    except HTTPException as he:
+        # Re-raise HTTP exceptions as-is
+        raise he
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@api_router.post("/upload/sessions/{session_id}/complete")
+async def complete_upload_session(session_id: str):
+    """Assemble a fully received upload into a content item on its profile"""
+    try:
+        # Claim the session so concurrent finalize calls can't both assemble it
+        session = await db.upload_sessions.find_one_and_update(
+            {"id": session_id, "status": "pending"},
+            {"$set": {"status": "finalizing"}}
+        )
+        if not session:
+            existing = await db.upload_sessions.find_one({"id": session_id}, {"_id": 1})
+            if not existing:
+                raise HTTPException(status_code=404, detail="Upload session not found")
+            raise HTTPException(status_code=409, detail="Upload session is already finalized")
+
+        try:
+            missing = set(range(session["chunk_count"])) - set(session["received_chunks"])
+            if missing:
+                raise HTTPException(
+                    status_code=409,
+                    detail=f"Upload is missing {len(missing)} chunks, first missing is {min(missing)}"
+                )
+
+            blob_id, file_size, file_type, mime_type = await store_stream(
+                iter_session_chunks(session), session["file_name"]
+            )
+            content_item = ContentItem(
+                type=file_type,
+                mime_type=mime_type,
+                title=session["title"],
+                content="",
+                blob_id=blob_id,
+                file_name=session["file_name"],
+                file_size=file_size
+            )
+            if not await append_content_item(session["profile_id"], content_item):
+                raise HTTPException(status_code=404, detail="Profile not found")
+        except BaseException:
+            await db.upload_sessions.update_one({"id": session_id}, {"$set": {"status": "pending"}})
+            raise
+
+        await db.upload_sessions.update_one(
+            {"id": session_id},
+            {"$set": {"status": "completed", "content_item_id": content_item.id}}
+        )
+        await db.upload_chunks.delete_many({"session_id": session_id})
+        await schedule_item_derivatives(session["profile_id"], content_item)
+        return {"message": "Content added successfully", "content_item": content_item}
+    except HTTPException as he:
+        # Re-raise HTTP exceptions as-is
+        raise he
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@api_router.get("/jobs/{job_id}", response_model=Job)
+async def get_job(job_id: str):
+    """Report the status and progress of a background job"""
+    try:
+        job = await db.jobs.find_one({"id": job_id})
+        if not job:
+            raise HTTPException(status_code=404, detail="Job not found")
+        return Job(**job)
+    except HTTPException as he:
+        # Re-raise HTTP exceptions as-is
+        raise he
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@api_router.get("/cache/stats")
+async def get_cache_stats():
+    """Report response cache hit/miss counters"""
+    return response_cache.stats()
+
 # Original status check routes
 @api_router.post("/status", response_model=StatusCheck)
 async def create_status_check(input: StatusCheckCreate):
@@ -238,14 +3421,69 @@ async def create_status_check(input: StatusCheckCreate):
     _ = await db.status_checks.insert_one(status_obj.dict())
     return status_obj
 
-@api_router.get("/status", response_model=List[StatusCheck])
-async def get_status_checks():
-    status_checks = await db.status_checks.find().to_list(1000)
-    return [StatusCheck(**status_check) for status_check in status_checks]
+def to_naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    """Normalize a query datetime to the naive UTC values stored in Mongo"""
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+async def iter_ndjson(cursor, model) -> AsyncIterator[str]:
+    """Yield documents as NDJSON lines as the Motor cursor produces them"""
+    async for document in cursor:
+        yield model(**document).json() + "\n"
+
+MAX_STATUS_PAGE_SIZE = 1000
+
+@api_router.get("/status", response_model=Union[StatusCheckPage, List[StatusCheck]])
+async def get_status_checks(
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_STATUS_PAGE_SIZE),
+    format: Literal["json", "ndjson"] = "json"
+):
+    """Get status checks, newest first
+
+    ``since`` (inclusive) and ``until`` (exclusive) bound the time range.
+    Passing ``cursor`` (empty for the first page) returns keyset pages
+    with ``next_cursor``; ``format=ndjson`` streams every matching check.
+    """
+    query = keyset_filter(cursor, field="timestamp")
+    time_range = {}
+    if since:
+        time_range["$gte"] = to_naive_utc(since)
+    if until:
+        time_range["$lt"] = to_naive_utc(until)
+    if time_range:
+        query = {"$and": [query, {"timestamp": time_range}]}
+
+    status_cursor = db.status_checks.find(query, {"_id": 0}).sort([("timestamp", -1), ("id", -1)])
+    if format == "ndjson":
+        if limit:
+            status_cursor = status_cursor.limit(limit)
+        return StreamingResponse(iter_ndjson(status_cursor, StatusCheck), media_type="application/x-ndjson")
+
+    limit = limit or (100 if cursor is not None else 1000)
+    status_checks = await status_cursor.limit(limit).to_list(limit)
+    items = [StatusCheck(**status_check) for status_check in status_checks]
+    if cursor is None:
+        return items
+
+    next_cursor = None
+    if len(items) == limit:
+        next_cursor = encode_cursor(items[-1].timestamp, items[-1].id)
+    return StatusCheckPage(items=items, next_cursor=next_cursor)
 
 # Include the router in the main app
 app.include_router(api_router)
 
+app.add_middleware(MaxBodySizeMiddleware, max_bytes=MAX_UPLOAD_BYTES)
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Prometheus scrape endpoint"""
+    return Response(content=metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -254,6 +3492,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Outermost, so rejected and CORS preflight requests are measured too
+app.add_middleware(MetricsMiddleware, routes=app.routes)
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -261,6 +3502,131 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Indexes ensured on every startup; create_indexes is a no-op when they exist
+INDEXES = {
+    "user_profiles": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        # Feed sort with a tiebreaker, backing both skip and keyset pagination
+        IndexModel([("created_at", DESCENDING), ("id", DESCENDING)]),
+        IndexModel([("email", ASCENDING)]),
+        # Profile search: relevance-ranked full text, and name prefixes
+        IndexModel(
+            [("name", TEXT), ("bio", TEXT), ("content_items.title", TEXT)],
+            weights={"name": 10, "content_items.title": 3, "bio": 1},
+            name="profile_text"
+        ),
+        IndexModel([("name_normalized", ASCENDING), ("id", ASCENDING)]),
+        # Polling change feed
+        IndexModel([("updated_at", ASCENDING), ("id", ASCENDING)]),
+        # Tombstones expire once reaped, so none can expire holding blob refs
+        IndexModel([("reaped_at", ASCENDING)], expireAfterSeconds=TOMBSTONE_TTL_SECONDS),
+        IndexModel([("deleted_at", ASCENDING)], sparse=True),
+    ],
+    "blob_refs": [
+        IndexModel([("zero_since", ASCENDING)], sparse=True),
+        IndexModel([("collecting_since", ASCENDING)], sparse=True),
+    ],
+    "status_checks": [
+        IndexModel([("timestamp", DESCENDING), ("id", DESCENDING)]),
+    ],
+    # Abandoned resumable uploads expire along with their chunks
+    "upload_sessions": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("created_at", ASCENDING)], expireAfterSeconds=UPLOAD_SESSION_TTL),
+    ],
+    "jobs": [
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("status", ASCENDING), ("run_after", ASCENDING)]),
+        # Queued and running jobs have no finished_at, so only finished ones expire
+        IndexModel([("finished_at", ASCENDING)], expireAfterSeconds=JOB_RETENTION_SECONDS),
+    ],
+    "upload_chunks": [
+        IndexModel([("session_id", ASCENDING), ("index", ASCENDING)], unique=True),
+        IndexModel([("created_at", ASCENDING)], expireAfterSeconds=UPLOAD_SESSION_TTL),
+    ],
+}
+
+def plan_stages(plan: dict) -> List[str]:
+    """Flatten an explain() winning plan into its stage names, outermost first"""
+    plan = plan.get("queryPlan", plan)
+    stages = [plan.get("stage", "?")]
+    if "inputStage" in plan:
+        stages += plan_stages(plan["inputStage"])
+    for child in plan.get("inputStages", []):
+        stages += plan_stages(child)
+    return stages
+
+async def check_query_plans() -> dict:
+    """Explain the hot queries and log any that don't use an index
+
+    Returns the stages of each winning plan by query name.
+    """
+    hot_queries = {
+        "profile_by_id": db.user_profiles.find({"id": ""}),
+        "profile_feed": db.user_profiles.find(LIVE_PROFILE).sort([("created_at", -1), ("id", -1)]).limit(10),
+        "profile_text_search": db.user_profiles.find({"$text": {"$search": "a"}, **LIVE_PROFILE}).limit(10),
+        "profile_prefix_search": db.user_profiles.find(
+            {"name_normalized": {"$regex": "^a"}, **LIVE_PROFILE}
+        ).sort([("name_normalized", 1), ("id", 1)]).limit(10),
+        "status_checks": db.status_checks.find().sort([("timestamp", -1), ("id", -1)]).limit(10),
+    }
+    plans = {}
+    for name, cursor in hot_queries.items():
+        explain = await cursor.explain()
+        stages = plan_stages(explain["queryPlanner"]["winningPlan"])
+        plans[name] = stages
+        if "COLLSCAN" in stages or "SORT" in stages:
+            logger.warning("Query %s is not index-backed: %s", name, " <- ".join(stages))
+        else:
+            logger.info("Query %s plan: %s", name, " <- ".join(stages))
+    return plans
+
+# Optional retention for status checks, e.g. 2592000 to keep 30 days
+STATUS_CHECK_TTL_SECONDS = os.environ.get('STATUS_CHECK_TTL_SECONDS')
+if STATUS_CHECK_TTL_SECONDS:
+    INDEXES["status_checks"].append(
+        IndexModel([("timestamp", ASCENDING)], expireAfterSeconds=int(STATUS_CHECK_TTL_SECONDS))
+    )
+
+async def ensure_indexes():
+    """Idempotently create every index the app's queries rely on"""
+    for collection, indexes in INDEXES.items():
+        try:
+            await db[collection].create_indexes(indexes)
+        except OperationFailure as e:
+            # e.g. duplicate ids in old data; the app still runs, just slower
+            logger.error("Could not create indexes on %s: %s", collection, e)
+
+@app.on_event("startup")
+async def warm_up_db_pool():
+    """Open the pool's minimum connections before the first request needs them"""
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(client.admin.command("ping") for _ in range(max(MONGO_MIN_POOL_SIZE, 1))))
+    except Exception as e:
+        logger.error("Could not warm up the MongoDB connection pool: %s", e)
+        return
+    logger.info("Warmed up MongoDB connection pool in %.0f ms", (time.perf_counter() - started) * 1000)
+
+@app.on_event("startup")
+async def startup_indexes():
+    await ensure_indexes()
+    try:
+        await check_query_plans()
+    except Exception as e:
+        logger.warning("Could not check query plans: %s", e)
+
+@app.on_event("startup")
+async def start_job_workers():
+    job_queue.start()
+    await queue_migrations()
+    await schedule_periodic_job("collect_blobs", BLOB_GC_INTERVAL_SECONDS)
+    await schedule_periodic_job("reap_tombstones", REAP_SWEEP_INTERVAL_SECONDS)
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+    await job_queue.stop()
+    await change_hub.stop()
+    client.close()
+    if _cpu_pool is not None:
+        _cpu_pool.shutdown(cancel_futures=True)
\ No newline at end of file
@@ -0,0 +1,530 @@
+#!/usr/bin/env python3
+"""Local benchmarks for the backend
+
+Usage:
+    python backend_bench.py memory [SIZE_MB ...]
+    python backend_bench.py bulk [--url URL] [--rows N]
+    python backend_bench.py sniff [--iterations N]
+    python backend_bench.py search [--profiles N] [--queries N]
+    python backend_bench.py serialize [--items N] [--item-kb KB] [--iterations N]
+    python backend_bench.py load [--db mock|mongo] [--cache none|memory] [--profiles N] [--media-kb KB]
+                                 [--requests N] [--concurrency N] [--save FILE] [--compare FILE]
+"""
+import argparse
+import asyncio
+import base64
+import json
+import logging
+import os
+import random
+import resource
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent / "backend"))
+os.environ.setdefault("BLOB_BACKEND", "local")
+
+import httpx  # noqa: E402
+import requests  # noqa: E402
+import server  # noqa: E402
+from starlette.datastructures import UploadFile  # noqa: E402
+
+MB = 1024 * 1024
+
+# The app logs at INFO, which would include a line per benchmark request
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+
+def make_upload(size: int) -> UploadFile:
+    """Build an UploadFile spooled to disk, like Starlette's multipart parser does"""
+    spool = tempfile.SpooledTemporaryFile(max_size=MB)
+    block = os.urandom(MB)
+    for _ in range(size // MB):
+        spool.write(block)
+    spool.write(block[:size % MB])
+    spool.seek(0)
+    return UploadFile(spool, filename="bench.mp4", size=size)
+
+
+async def legacy_upload(upload: UploadFile) -> None:
+    """The old path: read the whole file and base64 encode it"""
+    file_content = await upload.read()
+    server.convert_file_to_base64(file_content)
+
+
+async def streaming_upload(upload: UploadFile) -> None:
+    """The current path: stream chunks straight into the blob store"""
+    await server.store_upload(upload)
+
+
+async def measure(path, size: int) -> tuple:
+    upload = make_upload(size)
+    tracemalloc.start()
+    started = time.perf_counter()
+    await path(upload)
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    await upload.close()
+    return peak, elapsed
+
+
+async def bench_memory(sizes_mb) -> None:
+    from mongomock_motor import AsyncMongoMockClient
+
+    print("\n=== Upload memory benchmark ===\n")
+    print(f"{'size':>8} {'path':<10} {'peak MB':>10} {'seconds':>9}")
+    with tempfile.TemporaryDirectory() as blob_dir:
+        # Stored blobs are reference counted in Mongo
+        server.bind_db(AsyncMongoMockClient())
+        server.blob_store = server.LocalBlobStore(Path(blob_dir))
+        for size_mb in sizes_mb:
+            for name, path in (("legacy", legacy_upload), ("streaming", streaming_upload)):
+                peak, elapsed = await measure(path, size_mb * MB)
+                print(f"{size_mb:>6}MB {name:<10} {peak / MB:>10.1f} {elapsed:>9.2f}")
+
+
+def bench_bulk(url: str, rows: int) -> None:
+    """Compare importing profiles one request at a time against /profiles/bulk"""
+    print("\n=== Bulk profile import benchmark ===\n")
+    profiles = [
+        {"name": f"Bench User {i}", "email": f"bench{i}@example.com", "bio": "Imported by backend_bench.py"}
+        for i in range(rows)
+    ]
+
+    session = requests.Session()
+    started = time.perf_counter()
+    for profile in profiles:
+        session.post(f"{url}/profiles", json=profile).raise_for_status()
+    single = time.perf_counter() - started
+
+    body = "".join(json.dumps(profile) + "\n" for profile in profiles)
+    started = time.perf_counter()
+    response = session.post(
+        f"{url}/profiles/bulk",
+        data=body.encode("utf-8"),
+        headers={"Content-Type": "application/x-ndjson"}
+    )
+    response.raise_for_status()
+    bulk = time.perf_counter() - started
+
+    print(f"{'route':<16} {'seconds':>9} {'rows/s':>10}")
+    print(f"{'POST /profiles':<16} {single:>9.2f} {rows / single:>10.0f}")
+    print(f"{'POST /bulk':<16} {bulk:>9.2f} {rows / bulk:>10.0f}")
+    print(f"\nBulk report: {response.json()['inserted']} inserted, {response.json()['failed']} failed")
+
+
+def legacy_get_file_type(filename: str) -> str:
+    """The old lookup: split the name and scan freshly built lists"""
+    ext = filename.lower().split('.')[-1] if '.' in filename else ''
+    if ext in ['jpg', 'jpeg', 'png', 'gif', 'bmp', 'webp', 'svg']:
+        return 'image'
+    elif ext in ['mp4', 'avi', 'mov', 'wmv', 'flv', 'webm']:
+        return 'video'
+    elif ext in ['mp3', 'wav', 'flac', 'aac', 'ogg', 'm4a']:
+        return 'audio'
+    return 'text'
+
+
+SNIFF_SAMPLES = (
+    ("photo.JPG", b"\xff\xd8\xff\xe0\x00\x10JFIF\x00" + bytes(500)),
+    ("clip.m4a", b"\x00\x00\x00\x20ftypM4A \x00\x00\x00\x00" + bytes(500)),
+    ("song.flac", b"fLaC\x00\x00\x00\x22" + bytes(500)),
+    ("notes.txt", b"Just some plain text notes\n" * 20),
+    ("archive.tar.gz", b"\x1f\x8b\x08\x00" + bytes(500)),
+)
+
+
+def bench_sniff(iterations: int) -> None:
+    """Per-call cost of extension lookup and magic-byte sniffing"""
+    print("\n=== File type detection micro-benchmark ===\n")
+    print(f"{'file':<16} {'legacy ns':>10} {'lookup ns':>10} {'sniff ns':>10}  sniffed")
+    for filename, head in SNIFF_SAMPLES:
+        timings = [
+            timeit.timeit(lambda: fn(*args), number=iterations) / iterations * 1e9
+            for fn, args in (
+                (legacy_get_file_type, (filename,)),
+                (server.get_file_type, (filename,)),
+                (server.sniff_file_type, (head, filename)),
+            )
+        ]
+        sniffed = " ".join(server.sniff_file_type(head, filename))
+        print(f"{filename:<16} {timings[0]:>10.0f} {timings[1]:>10.0f} {timings[2]:>10.0f}  {sniffed}")
+
+
+SYLLABLES = ("an", "bel", "cor", "da", "el", "fin", "gar", "ha", "is", "jo", "ka", "lu",
+             "mar", "ne", "o", "pe", "qui", "ro", "sa", "ti", "u", "ve", "wil", "xa", "yo", "ze")
+WORDS = ("painter", "sculptor", "photographer", "musician", "poet", "dancer", "designer",
+         "architect", "filmmaker", "writer", "ceramics", "portrait", "landscape", "abstract")
+
+
+def synthetic_profile(rng: random.Random) -> dict:
+    name = " ".join(
+        "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3))).capitalize()
+        for _ in range(2)
+    )
+    profile = server.UserProfile(
+        name=name,
+        email=f"{name.replace(' ', '.').lower()}@example.com",
+        bio=" ".join(rng.choice(WORDS) for _ in range(8)),
+        content_items=[
+            server.ContentItem(type="text", title=" ".join(rng.choice(WORDS) for _ in range(3)), content="")
+            for _ in range(rng.randint(0, 3))
+        ]
+    )
+    return server.profile_document(profile)
+
+
+def percentile(samples, pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+async def bench_search(profiles: int, queries: int) -> None:
+    """Seed a scratch database with synthetic profiles and time search queries
+
+    Needs a real MongoDB at MONGO_URL; the text index is not emulated by mocks.
+    """
+    print("\n=== Profile search benchmark ===\n")
+    db_name = f"{os.environ.get('DB_NAME', 'test_database')}_search_bench"
+    server.db = server.client[db_name]
+    rng = random.Random(42)
+    try:
+        await server.db.user_profiles.drop()
+        for start in range(0, profiles, 5000):
+            batch = [synthetic_profile(rng) for _ in range(min(5000, profiles - start))]
+            await server.db.user_profiles.insert_many(batch, ordered=False)
+        await server.ensure_indexes()
+        for name, stages in (await server.check_query_plans()).items():
+            print(f"plan {name:<22} {' <- '.join(stages)}")
+
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            cases = (
+                ("text", lambda: {"q": rng.choice(WORDS)}),
+                ("text 2 words", lambda: {"q": f"{rng.choice(WORDS)} {rng.choice(WORDS)}"}),
+                ("prefix", lambda: {"q": rng.choice(SYLLABLES) + rng.choice(SYLLABLES)[0], "mode": "prefix"}),
+            )
+            print(f"\n{profiles} profiles, {queries} queries per case\n")
+            print(f"{'mode':<14} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+            for label, params in cases:
+                samples = []
+                for _ in range(queries):
+                    started = time.perf_counter()
+                    response = await client.get("/api/profiles/search", params=params())
+                    response.raise_for_status()
+                    samples.append((time.perf_counter() - started) * 1000)
+                print(f"{label:<14} {statistics.median(samples):>8.2f} "
+                      f"{percentile(samples, 0.95):>8.2f} {percentile(samples, 0.99):>8.2f}")
+    finally:
+        await server.client.drop_database(db_name)
+
+
+def large_profile(items: int, item_size: int) -> dict:
+    """A stored profile document with legacy inline base64 media, as read from Mongo"""
+    profile = server.UserProfile(
+        name="Serialization Bench",
+        email="bench@example.com",
+        bio="Profile with inline media",
+        content_items=[
+            server.ContentItem(type="image", title=f"Item {i}", content=base64.b64encode(os.urandom(item_size)).decode())
+            for i in range(items)
+        ]
+    )
+    return server.profile_document(profile)
+
+
+def bench_serialize(items: int, item_kb: int, iterations: int) -> None:
+    """CPU per profile response: validate + stdlib json against the trusted orjson path"""
+    print("\n=== Profile serialization benchmark ===\n")
+    if server.orjson is None:
+        print("orjson is not installed")
+        return
+    doc = large_profile(items, item_kb * 1024)
+    print(f"{items} items of {item_kb}KB, {iterations} iterations\n")
+    print(f"{'path':<10} {'cpu ms':>9} {'wall ms':>9} {'MB/s':>8}")
+    results = {}
+    for label, fast in (("validated", False), ("fast", True)):
+        server.FAST_JSON = fast
+        body = server.profile_body(doc)
+        cpu_started, wall_started = time.process_time(), time.perf_counter()
+        for _ in range(iterations):
+            server.profile_body(doc)
+        cpu = (time.process_time() - cpu_started) / iterations * 1000
+        wall = (time.perf_counter() - wall_started) / iterations * 1000
+        results[label] = body
+        print(f"{label:<10} {cpu:>9.2f} {wall:>9.2f} {len(body) / MB / (wall / 1000):>8.0f}")
+    server.FAST_JSON = False
+    print(f"\nIdentical JSON: {json.loads(results['validated']) == json.loads(results['fast'])}")
+
+
+class InProcessTarget:
+    """The app served in this process over ASGI, backed by mongomock-motor"""
+
+    def __init__(self, cache: str):
+        self.cache = cache
+
+    async def __aenter__(self):
+        from mongomock_motor import AsyncMongoMockClient
+
+        self.blob_dir = tempfile.TemporaryDirectory()
+        os.environ["CACHE_BACKEND"] = self.cache
+        server.response_cache = server.create_response_cache()
+        server.bind_db(AsyncMongoMockClient())
+        server.blob_store = server.LocalBlobStore(Path(self.blob_dir.name))
+        transport = httpx.ASGITransport(app=server.app)
+        self.http = httpx.AsyncClient(transport=transport, base_url="http://bench/api", timeout=60)
+        return self
+
+    def peak_rss(self) -> int:
+        # Includes the load generator itself, since both share the process
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+    async def __aexit__(self, *exc):
+        await self.http.aclose()
+        self.blob_dir.cleanup()
+
+
+class SubprocessTarget:
+    """backend/server.py under uvicorn against a scratch database on MONGO_URL"""
+
+    def __init__(self, cache: str):
+        self.cache = cache
+
+    async def __aenter__(self):
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        self.blob_dir = tempfile.TemporaryDirectory()
+        self.db_name = f"{os.environ.get('DB_NAME', 'test_database')}_load_bench"
+        env = dict(os.environ, DB_NAME=self.db_name, BLOB_BACKEND="local", BLOB_DIR=self.blob_dir.name,
+                   CACHE_BACKEND=self.cache)
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "server:app", "--host", "127.0.0.1", "--port", str(port)],
+            cwd=Path(__file__).parent / "backend", env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        self.http = httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}/api", timeout=60)
+        for _ in range(100):
+            try:
+                (await self.http.get("/")).raise_for_status()
+                return self
+            except httpx.TransportError:
+                await asyncio.sleep(0.1)
+        await self.__aexit__()
+        raise RuntimeError("Server did not start")
+
+    def peak_rss(self) -> int:
+        with open(f"/proc/{self.process.pid}/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+        return 0
+
+    async def __aexit__(self, *exc):
+        await self.http.aclose()
+        self.process.terminate()
+        self.process.wait()
+        await server.client.drop_database(self.db_name)
+        self.blob_dir.cleanup()
+
+
+async def seed(http: httpx.AsyncClient, profiles: int, media_profiles: int, media_size: int, depth: int) -> dict:
+    """Create profiles and media through the API, returning ids to drive load with"""
+    rng = random.Random(7)
+    rows = [
+        {"name": f"Load User {i}", "email": f"load{i}@example.com", "bio": " ".join(rng.choice(WORDS) for _ in range(8))}
+        for i in range(profiles)
+    ]
+    response = await http.post(
+        "/profiles/bulk",
+        content="".join(json.dumps(row) + "\n" for row in rows).encode("utf-8"),
+        headers={"Content-Type": "application/x-ndjson"}
+    )
+    response.raise_for_status()
+    profile_ids = [row["id"] for row in response.json()["results"] if row.get("id")]
+
+    media = []
+    for profile_id in profile_ids[:media_profiles]:
+        response = await http.post(
+            f"/profiles/{profile_id}/content",
+            data={"title": "Seeded media", "content_type": "video"},
+            files={"file": ("seed.mp4", os.urandom(media_size))}
+        )
+        response.raise_for_status()
+        media.append((profile_id, response.json()["content_item"]["id"]))
+
+    # Walk the feed to find the cursor `depth` pages in
+    cursor = ""
+    for _ in range(depth):
+        page = (await http.get("/profiles", params={"view": "summary", "cursor": cursor, "limit": 10})).json()
+        if not page["next_cursor"]:
+            break
+        cursor = page["next_cursor"]
+    return {"profile_ids": profile_ids, "media": media, "deep_cursor": cursor}
+
+
+def load_scenarios(seeded: dict, media_size: int, depth: int) -> dict:
+    """Route name -> coroutine function issuing one representative request"""
+    rng = random.Random(11)
+    payload = os.urandom(media_size)
+
+    def media_item():
+        return rng.choice(seeded["media"])
+
+    return {
+        "feed first page": lambda http: http.get("/profiles", params={"view": "summary", "cursor": "", "limit": 10}),
+        "feed deep cursor": lambda http: http.get(
+            "/profiles", params={"view": "summary", "cursor": seeded["deep_cursor"], "limit": 10}
+        ),
+        "feed deep skip": lambda http: http.get("/profiles", params={"skip": depth * 10, "limit": 10}),
+        "profile detail": lambda http: http.get(f"/profiles/{rng.choice(seeded['profile_ids'])}"),
+        "media raw": lambda http: http.get("/profiles/{}/content/{}/raw".format(*media_item())),
+        "upload": lambda http: http.post("/upload", files={"file": ("load.mp4", payload)}),
+        "add content": lambda http: http.post(
+            f"/profiles/{rng.choice(seeded['profile_ids'])}/content",
+            data={"title": "Load media", "content_type": "video"},
+            files={"file": ("load.mp4", payload)}
+        ),
+    }
+
+
+async def drive(http: httpx.AsyncClient, request, total: int, concurrency: int) -> dict:
+    """Issue `total` requests from `concurrency` workers and summarize latency"""
+    latencies = []
+    errors = 0
+    remaining = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for _ in remaining:
+            started = time.perf_counter()
+            try:
+                response = await request(http)
+                failed = response.status_code >= 400
+            except httpx.HTTPError:
+                failed = True
+            latencies.append((time.perf_counter() - started) * 1000)
+            errors += failed
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        "requests": total,
+        "errors": errors,
+        "rps": total / elapsed,
+        "p50_ms": percentile(latencies, 0.50),
+        "p95_ms": percentile(latencies, 0.95),
+        "p99_ms": percentile(latencies, 0.99),
+    }
+
+
+def compare_baseline(results: dict, baseline_path: str, threshold: float) -> bool:
+    """Print per-route changes against a saved baseline; True if anything regressed"""
+    baseline = json.loads(Path(baseline_path).read_text())["routes"]
+    regressed = False
+    print(f"\nCompared with {baseline_path} (threshold {threshold:.0%})\n")
+    print(f"{'route':<18} {'p95 change':>11} {'rps change':>11}")
+    for route, current in results.items():
+        if route not in baseline:
+            continue
+        p95_change = current["p95_ms"] / baseline[route]["p95_ms"] - 1
+        rps_change = current["rps"] / baseline[route]["rps"] - 1
+        flag = p95_change > threshold or rps_change < -threshold
+        regressed |= flag
+        print(f"{route:<18} {p95_change:>+11.1%} {rps_change:>+11.1%}{'  REGRESSION' if flag else ''}")
+    return regressed
+
+
+async def bench_load(args) -> bool:
+    """Seed the app and drive concurrent load at each route"""
+    print("\n=== Load benchmark ===\n")
+    media_size = args.media_kb * 1024
+    target = (InProcessTarget if args.db == "mock" else SubprocessTarget)(args.cache)
+    async with target:
+        seeded = await seed(target.http, args.profiles, min(args.profiles, 20), media_size, args.depth)
+        scenarios = load_scenarios(seeded, media_size, args.depth)
+        results = {}
+        print(f"{'route':<18} {'reqs':>6} {'errors':>6} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+        for route, request in scenarios.items():
+            result = await drive(target.http, request, args.requests, args.concurrency)
+            results[route] = result
+            print(f"{route:<18} {result['requests']:>6} {result['errors']:>6} {result['rps']:>8.0f} "
+                  f"{result['p50_ms']:>8.2f} {result['p95_ms']:>8.2f} {result['p99_ms']:>8.2f}")
+        peak_rss = target.peak_rss()
+    print(f"\nPeak RSS: {peak_rss / MB:.0f} MB")
+
+    if args.save:
+        Path(args.save).write_text(json.dumps({
+            "config": {key: value for key, value in vars(args).items() if key not in ("save", "compare")},
+            "peak_rss_bytes": peak_rss,
+            "routes": results,
+        }, indent=2))
+        print(f"Saved results to {args.save}")
+    if args.compare:
+        return compare_baseline(results, args.compare, args.threshold)
+    return False
+
+
+def main(argv) -> None:
+    parser = argparse.ArgumentParser(description="Local benchmarks for the backend")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    memory = commands.add_parser("memory", help="peak memory of the upload paths")
+    memory.add_argument("sizes", nargs="*", type=int, default=[8, 64, 256], metavar="SIZE_MB")
+
+    bulk = commands.add_parser("bulk", help="single-row vs bulk profile import against a running server")
+    bulk.add_argument("--url", default="http://localhost:8001/api")
+    bulk.add_argument("--rows", type=int, default=2000)
+
+    sniff = commands.add_parser("sniff", help="file type detection per-call cost")
+    sniff.add_argument("--iterations", type=int, default=200000)
+
+    search = commands.add_parser("search", help="search latency over a synthetic dataset (needs MongoDB)")
+    search.add_argument("--profiles", type=int, default=100000)
+    search.add_argument("--queries", type=int, default=200)
+
+    serialize = commands.add_parser("serialize", help="validated vs FAST_JSON profile encoding")
+    serialize.add_argument("--items", type=int, default=20)
+    serialize.add_argument("--item-kb", type=int, default=256)
+    serialize.add_argument("--iterations", type=int, default=50)
+
+    load = commands.add_parser("load", help="concurrent load on each route with latency percentiles")
+    load.add_argument("--db", choices=["mock", "mongo"], default="mock",
+                      help="mock: in-process with mongomock-motor; mongo: uvicorn subprocess on MONGO_URL")
+    load.add_argument("--cache", choices=["none", "memory"], default="none",
+                      help="response cache; off by default so reads measure Mongo, not cache hits")
+    load.add_argument("--profiles", type=int, default=1000)
+    load.add_argument("--media-kb", type=int, default=256)
+    load.add_argument("--depth", type=int, default=50, help="feed page depth for the deep page routes")
+    load.add_argument("--requests", type=int, default=500, help="requests per route")
+    load.add_argument("--concurrency", type=int, default=16)
+    load.add_argument("--save", metavar="FILE", help="write results as a JSON baseline")
+    load.add_argument("--compare", metavar="FILE", help="compare with a saved baseline")
+    load.add_argument("--threshold", type=float, default=0.10, help="relative change counted as a regression")
+
+    args = parser.parse_args(argv[1:])
+    if args.command == "memory":
+        asyncio.run(bench_memory(args.sizes))
+    elif args.command == "bulk":
+        bench_bulk(args.url, args.rows)
+    elif args.command == "sniff":
+        bench_sniff(args.iterations)
+    elif args.command == "search":
+        asyncio.run(bench_search(args.profiles, args.queries))
+    elif args.command == "serialize":
+        bench_serialize(args.items, args.item_kb, args.iterations)
+    elif args.command == "load":
+        if asyncio.run(bench_load(args)):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -8,8 +8,11 @@ import sys
 from typing import Dict, Any, List, Optional
 import uuid
 
-# Get the backend URL from the frontend .env file
-BACKEND_URL = "https://6ae7ad66-49fc-4f13-8adb-3983820800bd.preview.emergentagent.com/api"
+# Get the backend URL from the frontend .env file; BACKEND_URL overrides it,
+# e.g. BACKEND_URL=http://localhost:8001/api for a local server
+BACKEND_URL = os.environ.get(
+    "BACKEND_URL", "https://6ae7ad66-49fc-4f13-8adb-3983820800bd.preview.emergentagent.com/api"
+)
 
 # Test data
 TEST_PROFILE = {
@@ -164,7 +167,7 @@ class BackendAPITest:
                 os.remove(filename)
             
             if (response.status_code == 200 and 
-                "content" in response.json() and 
+                "blob_id" in response.json() and 
                 "file_type" in response.json()):
                 self.test_results["upload_file"] = True
                 print("✅ File upload test passed")
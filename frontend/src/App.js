@@ -11,13 +11,13 @@ const App = () => {
   const [hasMore, setHasMore] = useState(true);
   const [expandedProfile, setExpandedProfile] = useState(null);
   const [showUploadForm, setShowUploadForm] = useState(false);
-  const [skip, setSkip] = useState(0);
+  const [cursor, setCursor] = useState('');
   const limit = 10;
   const observerRef = useRef();
 
   // Load initial profiles
   useEffect(() => {
-    loadProfiles(0, true);
+    loadProfiles('', true);
   }, []);
 
   // Infinite scroll observer
@@ -25,7 +25,7 @@ const App = () => {
     const observer = new IntersectionObserver(
       (entries) => {
         if (entries[0].isIntersecting && hasMore && !loading) {
-          loadProfiles(skip);
+          loadProfiles(cursor);
         }
       },
       { threshold: 1.0 }
@@ -36,15 +36,17 @@ const App = () => {
     }
 
     return () => observer.disconnect();
-  }, [skip, hasMore, loading]);
+  }, [cursor, hasMore, loading]);
 
-  const loadProfiles = async (skipCount, reset = false) => {
+  const loadProfiles = async (pageCursor, reset = false) => {
     if (loading) return;
     
     setLoading(true);
     try {
-      const response = await axios.get(`${API}/profiles?skip=${skipCount}&limit=${limit}`);
-      const newProfiles = response.data;
+      const response = await axios.get(`${API}/profiles`, {
+        params: { cursor: pageCursor, limit, view: 'summary' }
+      });
+      const newProfiles = response.data.items;
       
       if (reset) {
         setProfiles(newProfiles);
@@ -52,8 +54,8 @@ const App = () => {
         setProfiles(prev => [...prev, ...newProfiles]);
       }
       
-      setSkip(skipCount + limit);
-      setHasMore(newProfiles.length === limit);
+      setCursor(response.data.next_cursor || '');
+      setHasMore(Boolean(response.data.next_cursor));
     } catch (error) {
       console.error('Error loading profiles:', error);
     } finally {
@@ -61,16 +63,29 @@ const App = () => {
     }
   };
 
+  // Apply inserted, updated and deleted profiles as they happen instead of re-walking the feed
+  useEffect(() => {
+    const events = new EventSource(`${API}/profiles/changes?format=sse`);
+    events.addEventListener('change', (event) => {
+      const change = JSON.parse(event.data);
+      setProfiles(prev => {
+        const rest = prev.filter(profile => profile.id !== change.id);
+        if (change.op === 'delete') {
+          return rest;
+        }
+        if (change.op === 'insert') {
+          return [change.profile, ...rest];
+        }
+        return prev.map(profile => (profile.id === change.id ? change.profile : profile));
+      });
+    });
+    return () => events.close();
+  }, []);
+
   const toggleProfile = (profileId) => {
     setExpandedProfile(expandedProfile === profileId ? null : profileId);
   };
 
-  const refreshProfiles = () => {
-    setSkip(0);
-    setHasMore(true);
-    loadProfiles(0, true);
-  };
-
   return (
     <div className="min-h-screen bg-gradient-to-br from-purple-50 to-blue-50">
       {/* Header */}
@@ -92,7 +107,6 @@ const App = () => {
         {showUploadForm && (
           <UploadForm 
             onClose={() => setShowUploadForm(false)}
-            onSuccess={refreshProfiles}
           />
         )}
 
@@ -130,6 +144,50 @@ const App = () => {
 };
 
 const ProfileCard = ({ profile, isExpanded, onToggle }) => {
+  const [contentItems, setContentItems] = useState(null);
+  const [contentCursor, setContentCursor] = useState(null);
+  const [loadingContent, setLoadingContent] = useState(false);
+
+  const loadContent = async (pageCursor) => {
+    setLoadingContent(true);
+    try {
+      const response = await axios.get(`${API}/profiles/${profile.id}/content`, {
+        params: { cursor: pageCursor || undefined, limit: 10 }
+      });
+      setContentItems(prev => [...(prev || []), ...response.data.items]);
+      setContentCursor(response.data.next_cursor);
+    } catch (error) {
+      console.error('Error loading profile content:', error);
+    } finally {
+      setLoadingContent(false);
+    }
+  };
+
+  // Feed cards are summaries; content is only fetched once expanded
+  useEffect(() => {
+    if (isExpanded && contentItems === null && !loadingContent) {
+      loadContent(null);
+    }
+  }, [isExpanded, contentItems, loadingContent]);
+
+  // Deferred uploads finish in the background and bump updated_at, which arrives
+  // as a change-feed update; refetch what's loaded so "Processing…" items resolve
+  useEffect(() => {
+    if (!contentItems || !contentItems.some(item => item.status === 'processing')) {
+      return;
+    }
+    let cancelled = false;
+    axios.get(`${API}/profiles/${profile.id}/content`, {
+      params: { limit: Math.min(Math.max(contentItems.length, 10), 100) }
+    }).then(response => {
+      if (!cancelled) {
+        setContentItems(response.data.items);
+        setContentCursor(response.data.next_cursor);
+      }
+    }).catch(error => console.error('Error refreshing profile content:', error));
+    return () => { cancelled = true; };
+  }, [profile.updated_at]);
+
   const formatDate = (dateString) => {
     return new Date(dateString).toLocaleDateString('en-US', {
       year: 'numeric',
@@ -138,12 +196,18 @@ const ProfileCard = ({ profile, isExpanded, onToggle }) => {
     });
   };
 
+  // Media is streamed from the raw endpoint so video/audio can seek
+  const mediaSrc = (item) => `${API}/profiles/${profile.id}/content/${item.id}/raw`;
+
   const renderContent = (item) => {
+    if (item.status === 'processing') {
+      return <p className="text-sm text-gray-500 italic">Processing…</p>;
+    }
     switch (item.type) {
       case 'image':
         return (
           <img
-            src={`data:image/jpeg;base64,${item.content}`}
+            src={`${mediaSrc(item)}?size=1024`}
             alt={item.title}
             className="max-w-full h-auto rounded-lg"
           />
@@ -154,19 +218,25 @@ const ProfileCard = ({ profile, isExpanded, onToggle }) => {
             controls
             className="max-w-full h-auto rounded-lg"
           >
-            <source src={`data:video/mp4;base64,${item.content}`} type="video/mp4" />
+            <source src={mediaSrc(item)} />
             Your browser does not support the video tag.
           </video>
         );
       case 'audio':
         return (
           <audio controls className="w-full">
-            <source src={`data:audio/mp3;base64,${item.content}`} type="audio/mp3" />
+            <source src={mediaSrc(item)} />
             Your browser does not support the audio tag.
           </audio>
         );
+      case 'file':
+        return (
+          <a href={mediaSrc(item)} download={item.file_name} className="text-blue-600 hover:underline">
+            {item.file_name || 'Download file'}
+          </a>
+        );
       default:
-        return <p className="text-gray-700">{item.content}</p>;
+        return <TextContent src={mediaSrc(item)} />;
     }
   };
 
@@ -180,9 +250,9 @@ const ProfileCard = ({ profile, isExpanded, onToggle }) => {
         <div className="flex items-center space-x-4">
           {/* Avatar */}
           <div className="w-12 h-12 rounded-full bg-gradient-to-br from-blue-400 to-purple-600 flex items-center justify-center text-white font-bold text-lg">
-            {profile.avatar ? (
+            {profile.avatar_url ? (
               <img
-                src={`data:image/jpeg;base64,${profile.avatar}`}
+                src={`${BACKEND_URL}${profile.avatar_url}${profile.avatar_url.includes('?') ? '&' : '?'}size=64`}
                 alt={profile.name}
                 className="w-12 h-12 rounded-full object-cover"
               />
@@ -203,7 +273,7 @@ const ProfileCard = ({ profile, isExpanded, onToggle }) => {
           {/* Expand/Collapse Icon */}
           <div className="flex items-center space-x-2">
             <span className="text-sm text-gray-500">
-              {profile.content_items.length} items
+              {profile.content_count} items
             </span>
             <svg
               className={`w-5 h-5 text-gray-400 transition-transform ${
@@ -228,8 +298,12 @@ const ProfileCard = ({ profile, isExpanded, onToggle }) => {
       {isExpanded && (
         <div className="px-6 pb-6 border-t border-gray-100">
           <div className="mt-4 space-y-4">
-            {profile.content_items.length > 0 ? (
-              profile.content_items.map((item) => (
+            {contentItems === null ? (
+              <div className="flex justify-center py-4">
+                <div className="animate-spin rounded-full h-6 w-6 border-b-2 border-blue-600"></div>
+              </div>
+            ) : contentItems.length > 0 ? (
+              contentItems.map((item) => (
                 <div
                   key={item.id}
                   className="p-4 bg-gray-50 rounded-lg"
@@ -258,6 +332,16 @@ const ProfileCard = ({ profile, isExpanded, onToggle }) => {
                 No content items yet
               </p>
             )}
+
+            {contentCursor && (
+              <button
+                onClick={() => loadContent(contentCursor)}
+                disabled={loadingContent}
+                className="w-full py-2 text-sm text-blue-600 hover:text-blue-800 disabled:opacity-50"
+              >
+                {loadingContent ? 'Loading...' : 'Load more'}
+              </button>
+            )}
           </div>
         </div>
       )}
@@ -265,7 +349,50 @@ const ProfileCard = ({ profile, isExpanded, onToggle }) => {
   );
 };
 
-const UploadForm = ({ onClose, onSuccess }) => {
+const TextContent = ({ src }) => {
+  const [text, setText] = useState('');
+
+  useEffect(() => {
+    axios.get(src, { responseType: 'text' })
+      .then(response => setText(response.data))
+      .catch(error => console.error('Error loading text content:', error));
+  }, [src]);
+
+  return <p className="text-gray-700">{text}</p>;
+};
+
+const CHUNKED_UPLOAD_THRESHOLD = 5 * 1024 * 1024;
+const UPLOAD_CHUNK_SIZE = 1024 * 1024;
+
+// Large files go through a resumable session so a dropped connection only
+// costs the chunk in flight
+const uploadInChunks = async (profileId, title, file) => {
+  const { data: session } = await axios.post(`${API}/upload/sessions`, {
+    profile_id: profileId,
+    title,
+    file_name: file.name,
+    file_size: file.size,
+    chunk_size: UPLOAD_CHUNK_SIZE
+  });
+
+  for (let index = 0; index < session.chunk_count; index++) {
+    const chunk = file.slice(index * session.chunk_size, (index + 1) * session.chunk_size);
+    for (let attempt = 1; ; attempt++) {
+      try {
+        await axios.put(`${API}/upload/sessions/${session.id}/chunks/${index}`, chunk, {
+          headers: { 'Content-Type': 'application/octet-stream' }
+        });
+        break;
+      } catch (error) {
+        if (attempt >= 3) throw error;
+      }
+    }
+  }
+
+  await axios.post(`${API}/upload/sessions/${session.id}/complete`);
+};
+
+const UploadForm = ({ onClose }) => {
   const [formData, setFormData] = useState({
     name: '',
     email: '',
@@ -335,7 +462,9 @@ const UploadForm = ({ onClose, onSuccess }) => {
 
       // Upload content items
       for (const item of contentItems) {
-        if (item.title && (item.content || item.file)) {
+        if (item.file && item.file.size > CHUNKED_UPLOAD_THRESHOLD) {
+          await uploadInChunks(profileId, item.title, item.file);
+        } else if (item.title && (item.content || item.file)) {
           const formData = new FormData();
           formData.append('title', item.title);
           formData.append('content_type', item.type);
@@ -346,7 +475,9 @@ const UploadForm = ({ onClose, onSuccess }) => {
             formData.append('text_content', item.content);
           }
 
+          // Files are post-processed in a background job on the server
           await axios.post(`${API}/profiles/${profileId}/content`, formData, {
+            params: item.file ? { defer: true } : undefined,
             headers: {
               'Content-Type': 'multipart/form-data',
             },
@@ -354,7 +485,7 @@ const UploadForm = ({ onClose, onSuccess }) => {
         }
       }
 
-      onSuccess();
+      // The new profile arrives through the change feed
       onClose();
     } catch (error) {
       console.error('Error creating profile:', error);
@@ -0,0 +1,35 @@
+"""Fixtures running the backend app in-process against mongomock-motor"""
+import os
+import sys
+from pathlib import Path
+
+import httpx
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+os.environ["BLOB_BACKEND"] = "local"
+os.environ["CACHE_BACKEND"] = "none"
+
+import server  # noqa: E402
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def backend(tmp_path):
+    """The server module bound to a fresh in-memory database and blob directory"""
+    from mongomock_motor import AsyncMongoMockClient
+
+    server.bind_db(AsyncMongoMockClient())
+    server.blob_store = server.LocalBlobStore(tmp_path / "blobs")
+    return server
+
+
+@pytest.fixture
+async def api(backend):
+    transport = httpx.ASGITransport(app=backend.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test/api") as client:
+        yield client
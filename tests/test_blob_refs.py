@@ -0,0 +1,85 @@
+"""Blob reference counting, profile reaping and blob collection"""
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+async def no_progress(progress):
+    pass
+
+
+@pytest.fixture
+def collect(backend, monkeypatch):
+    """Run collect_blobs with no grace period, once the refs backfill has completed"""
+    monkeypatch.setattr(backend, "BLOB_GC_GRACE_SECONDS", 0)
+
+    async def run():
+        await backend.JOB_HANDLERS["backfill_blob_refs"]({}, no_progress)
+        return await backend.collect_blobs({}, no_progress)
+    return run
+
+
+async def create_profile(api, name):
+    response = await api.post("/profiles", json={"name": name, "email": f"{name.lower()}@example.com"})
+    return response.json()
+
+
+async def add_file(api, profile, data):
+    response = await api.post(
+        f"/profiles/{profile['id']}/content",
+        data={"title": "shared", "content_type": "file"},
+        files={"file": ("shared.bin", data, "application/octet-stream")}
+    )
+    return response.json()["content_item"]
+
+
+async def test_reaping_one_profile_keeps_a_shared_blob(api, backend, collect):
+    ada, bob = await create_profile(api, "Ada"), await create_profile(api, "Bob")
+    item = await add_file(api, ada, b"same bytes")
+    assert (await add_file(api, bob, b"same bytes"))["blob_id"] == item["blob_id"]
+
+    await api.delete(f"/profiles/{ada['id']}")
+    await backend.reap_profile({"profile_id": ada["id"]}, no_progress)
+    await collect()
+
+    assert (await backend.db.blob_refs.find_one({"_id": item["blob_id"]}))["refs"] == 1
+    assert await backend.blob_store.exists(item["blob_id"])
+    bob_item = (await api.get(f"/profiles/{bob['id']}")).json()["content_items"][0]
+    raw = await api.get(f"/profiles/{bob['id']}/content/{bob_item['id']}/raw")
+    assert raw.content == b"same bytes"
+
+
+async def test_unattached_upload_is_collected_after_grace_period(api, backend, collect):
+    upload = (await api.post("/upload", files={"file": ("loose.bin", b"nobody", "application/octet-stream")})).json()
+    assert await backend.blob_store.exists(upload["blob_id"])
+
+    assert (await collect())["collected"] == 1
+    assert not await backend.blob_store.exists(upload["blob_id"])
+    assert await backend.db.blob_refs.find_one({"_id": upload["blob_id"]}) is None
+
+
+async def test_reads_miss_right_after_delete(api):
+    profile = await create_profile(api, "Ada")
+    item = await add_file(api, profile, b"private")
+    assert (await api.get(f"/profiles/{profile['id']}")).status_code == 200
+
+    assert (await api.delete(f"/profiles/{profile['id']}")).status_code == 200
+
+    assert (await api.get(f"/profiles/{profile['id']}")).status_code == 404
+    assert (await api.get(f"/profiles/{profile['id']}/content/{item['id']}/raw")).status_code == 404
+    assert profile["id"] not in [p["id"] for p in (await api.get("/profiles")).json()]
+
+
+async def test_backfill_does_not_recount_references_added_since(api, backend, collect):
+    profile = await create_profile(api, "Ada")
+    # A profile stored before blob_refs existed
+    await backend.db.user_profiles.update_one({"id": profile["id"]}, {"$unset": {"refs_counted": ""}})
+    item = await add_file(api, profile, b"late upload")
+
+    await collect()
+    assert (await backend.db.blob_refs.find_one({"_id": item["blob_id"]}))["refs"] == 1
+
+    await api.delete(f"/profiles/{profile['id']}")
+    await backend.reap_profile({"profile_id": profile["id"]}, no_progress)
+    assert (await collect())["collected"] == 1
+    assert not await backend.blob_store.exists(item["blob_id"])
@@ -0,0 +1,97 @@
+"""Response cache invalidation on profile writes"""
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+class FakePipeline:
+    """Queues commands and runs them on execute, like a redis.asyncio pipeline"""
+
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.commands = []
+
+    def __getattr__(self, name):
+        def queue(*args, **kwargs):
+            self.commands.append((name, args, kwargs))
+        return queue
+
+    async def execute(self):
+        return [await getattr(self.redis, name)(*args, **kwargs) for name, args, kwargs in self.commands]
+
+
+class FakeRedis:
+    """The subset of redis.asyncio.Redis that RedisCache uses, without expiry"""
+
+    def __init__(self):
+        self.values = {}
+
+    async def get(self, key):
+        return self.values.get(key)
+
+    async def set(self, key, value, ex=None, nx=False):
+        if nx and key in self.values:
+            return None
+        self.values[key] = value if isinstance(value, bytes) else str(value).encode()
+        return True
+
+    async def incr(self, key):
+        self.values[key] = str(int(self.values.get(key, 0)) + 1).encode()
+        return int(self.values[key])
+
+    async def pexpire(self, key, milliseconds):
+        return key in self.values
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+@pytest.fixture(params=["memory", "redis"])
+def cache(request, backend, monkeypatch):
+    if request.param == "memory":
+        response_cache = backend.MemoryCache(1024 * 1024, ttl=60)
+    else:
+        response_cache = backend.RedisCache(FakeRedis(), ttl=60)
+    monkeypatch.setattr(backend, "response_cache", response_cache)
+    return response_cache
+
+
+async def read_twice(api, cache, path):
+    """GET a path twice, returning the second response and whether it was a cache hit"""
+    await api.get(path)
+    hits = cache.hits
+    response = await api.get(path)
+    return response, cache.hits > hits
+
+
+async def test_content_add_invalidates_feed_and_detail(api, cache):
+    profile = (await api.post("/profiles", json={"name": "Ada", "email": "ada@example.com"})).json()
+    detail = f"/profiles/{profile['id']}"
+    assert (await read_twice(api, cache, "/profiles"))[1]
+    assert (await read_twice(api, cache, detail))[1]
+
+    await api.post(detail + "/content", data={"title": "note", "content_type": "text", "text_content": "hi"})
+
+    misses = cache.misses
+    feed = (await api.get("/profiles")).json()
+    assert [item["title"] for item in feed[0]["content_items"]] == ["note"]
+    assert [item["title"] for item in (await api.get(detail)).json()["content_items"]] == ["note"]
+    assert cache.misses == misses + 2
+
+
+async def test_delete_invalidates_feed_and_detail(api, cache):
+    profile = (await api.post("/profiles", json={"name": "Ada", "email": "ada@example.com"})).json()
+    detail = f"/profiles/{profile['id']}"
+    assert (await read_twice(api, cache, "/profiles"))[1]
+    assert (await read_twice(api, cache, detail))[1]
+
+    await api.delete(detail)
+
+    assert (await api.get("/profiles")).json() == []
+    assert (await api.get(detail)).status_code == 404
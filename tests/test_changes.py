@@ -0,0 +1,150 @@
+"""Profile change feed served from one poller per process"""
+import asyncio
+
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def polls(backend, monkeypatch):
+    """Calls made to iter_polled_changes, with polls that don't lag behind the clock"""
+    monkeypatch.setattr(backend, "CHANGE_POLL_LAG_SECONDS", 0)
+    monkeypatch.setattr(backend, "CHANGE_POLL_INTERVAL", 0.05)
+    calls = []
+    original = backend.iter_polled_changes
+
+    def counting(*args):
+        calls.append(args)
+        return original(*args)
+    monkeypatch.setattr(backend, "iter_polled_changes", counting)
+    yield calls
+    await backend.change_hub.stop()
+
+
+async def create_profile(api, name):
+    response = await api.post("/profiles", json={"name": name, "email": f"{name.lower()}@example.com"})
+    return response.json()
+
+
+async def test_long_polls_share_one_poller(api, polls):
+    token = (await api.get("/profiles/changes")).json()["next_token"]
+
+    waiting = [api.get("/profiles/changes", params={"since": token, "wait": 5}) for _ in range(5)]
+    pages, profile = await asyncio.gather(asyncio.gather(*waiting), create_profile(api, "Ada"))
+
+    assert [[(change["op"], change["id"]) for change in page.json()["changes"]] for page in pages] == \
+        [[("insert", profile["id"])]] * 5
+    assert len(polls) == 1
+
+
+async def test_resuming_a_recent_token_replays_from_the_buffer(api, polls):
+    token = (await api.get("/profiles/changes")).json()["next_token"]
+    ada = await create_profile(api, "Ada")
+    first = (await api.get("/profiles/changes", params={"since": token, "wait": 5})).json()
+    bob = await create_profile(api, "Bob")
+    second = (await api.get("/profiles/changes", params={"since": first["next_token"], "wait": 5})).json()
+
+    # Starting over from the first token replays both without another poll
+    again = (await api.get("/profiles/changes", params={"since": token, "limit": 2})).json()
+
+    assert [change["id"] for change in first["changes"]] == [ada["id"]]
+    assert [change["id"] for change in second["changes"]] == [bob["id"]]
+    assert [change["id"] for change in again["changes"]] == [ada["id"], bob["id"]]
+    assert len(polls) == 1
+
+
+async def test_tokens_older_than_the_buffer_catch_up_once(api, backend, polls):
+    ada = await create_profile(api, "Ada")
+    stale = backend.encode_change_token({"t": "2000-01-01T00:00:00", "i": ""})
+
+    page = (await api.get("/profiles/changes", params={"since": stale})).json()
+
+    assert [change["id"] for change in page["changes"]] == [ada["id"]]
+    assert len(polls) == 2
+
+
+class FakeOplog:
+    """Stands in for iter_stream_changes over a list of profile changes"""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.changes = []
+        self.idle_ticks = 0
+        self.opened = 0
+
+    def token(self, data):
+        return self.backend.encode_change_token({"r": {"_data": data}})
+
+    async def stream(self, resume_token, pre_images):
+        # Event tokens are "e<n>"; idle ones "i<n>.<tick>" like a post-batch token
+        self.opened += 1
+        position = int(resume_token["_data"][1:].split(".")[0]) if resume_token else len(self.changes)
+        while True:
+            if position < len(self.changes):
+                position += 1
+                yield self.changes[position - 1], self.token(f"e{position}"), f"e{position}"
+            else:
+                self.idle_ticks += 1
+                yield None, self.token(f"i{position}.{self.idle_ticks}"), None
+            await asyncio.sleep(0.01)
+
+    def append(self, profile_id):
+        self.changes.append(self.backend.ProfileChange(op="delete", id=profile_id))
+
+
+@pytest.fixture
+async def oplog(backend, monkeypatch):
+    oplog = FakeOplog(backend)
+
+    async def streams_supported():
+        return True, False
+    monkeypatch.setattr(backend, "change_stream_support", streams_supported)
+    monkeypatch.setattr(backend, "iter_stream_changes", oplog.stream)
+    yield oplog
+    await backend.change_hub.stop()
+
+
+async def read_changes(backend, since, count):
+    """The first `count` changes after `since`, and the last token seen"""
+    changes = []
+    async for change, token in backend.iter_profile_changes(since):
+        if change is not None:
+            changes.append(change.id)
+            if len(changes) == count:
+                return changes, token
+    return changes, None
+
+
+async def test_stream_subscribers_share_one_stream(backend, oplog):
+    oplog.append("old")
+    readers = [asyncio.create_task(read_changes(backend, None, 2)) for _ in range(3)]
+    await asyncio.sleep(0.05)
+    oplog.append("a")
+    oplog.append("b")
+
+    assert [(await reader)[0] for reader in readers] == [["a", "b"]] * 3
+    assert oplog.opened == 1
+
+
+async def test_stream_tokens_resume_from_buffer_or_catch_up(backend, oplog):
+    reader = asyncio.create_task(read_changes(backend, None, 1))
+    await asyncio.sleep(0.05)
+    oplog.append("a")
+    _, recent = await reader
+    oplog.append("b")
+    oplog.append("c")
+
+    # Handed out by this process: replayed without another stream
+    assert (await read_changes(backend, recent, 2))[0] == ["b", "c"]
+    assert oplog.opened == 1
+
+    # Unknown here, e.g. from another process: caught up once, then joined
+    # without repeating what both streams delivered while catching up
+    catching_up = asyncio.create_task(read_changes(backend, oplog.token("i0.0"), 5))
+    await asyncio.sleep(0.015)
+    oplog.append("d")
+    await asyncio.sleep(0.1)
+    oplog.append("e")
+    assert (await catching_up)[0] == ["a", "b", "c", "d", "e"]
+    assert oplog.opened == 2
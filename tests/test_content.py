@@ -0,0 +1,65 @@
+"""Content uploads"""
+import asyncio
+
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def interleaved(backend, monkeypatch):
+    """Yield to the event loop around each profile read and write
+
+    mongomock never yields, so without this concurrent requests run their
+    database calls back to back and a lost update can't happen.
+    """
+    collection_class = type(backend.db.user_profiles)
+    for name in ("find_one", "find_one_and_update", "update_one"):
+        async def yielding(self, *args, _method=getattr(collection_class, name), **kwargs):
+            await asyncio.sleep(0)
+            result = await _method(self, *args, **kwargs)
+            await asyncio.sleep(0)
+            return result
+        monkeypatch.setattr(collection_class, name, yielding)
+
+
+async def test_parallel_uploads_keep_every_item(api, interleaved):
+    profile = (await api.post("/profiles", json={"name": "Ada", "email": "ada@example.com"})).json()
+    uploads = 20
+
+    responses = await asyncio.gather(*(
+        api.post(
+            f"/profiles/{profile['id']}/content",
+            data={"title": f"file {i}", "content_type": "file"},
+            files={"file": (f"file{i}.bin", f"payload {i}".encode(), "application/octet-stream")}
+        )
+        for i in range(uploads)
+    ))
+
+    assert [response.status_code for response in responses] == [200] * uploads
+    items = (await api.get(f"/profiles/{profile['id']}")).json()["content_items"]
+    assert sorted(item["id"] for item in items) == sorted(
+        response.json()["content_item"]["id"] for response in responses
+    )
+
+
+async def test_uploaded_blob_attaches_to_profile(api, backend):
+    profile = (await api.post("/profiles", json={"name": "Ada", "email": "ada@example.com"})).json()
+    upload = (await api.post("/upload", files={"file": ("notes.txt", b"hello", "text/plain")})).json()
+
+    response = await api.post(
+        f"/profiles/{profile['id']}/content",
+        data={"title": "notes", "content_type": "file", "blob_id": upload["blob_id"], "file_name": "notes.txt"}
+    )
+
+    assert response.status_code == 200
+    item = response.json()["content_item"]
+    assert (item["blob_id"], item["type"], item["file_size"]) == (upload["blob_id"], "text", 5)
+    ref = await backend.db.blob_refs.find_one({"_id": upload["blob_id"]})
+    assert ref["refs"] == 1
+
+    missing = await api.post(
+        f"/profiles/{profile['id']}/content",
+        data={"title": "gone", "content_type": "file", "blob_id": "0" * 64}
+    )
+    assert missing.status_code == 404
@@ -0,0 +1,53 @@
+"""File type sniffing on real file headers"""
+import io
+import wave
+
+import pytest
+from PIL import Image
+
+import server
+
+
+def image_head(image_format: str) -> bytes:
+    output = io.BytesIO()
+    Image.new("RGB", (8, 8), "red").save(output, format=image_format)
+    return output.getvalue()[:server.SNIFF_BYTES]
+
+
+def wav_head() -> bytes:
+    output = io.BytesIO()
+    with wave.open(output, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(8000)
+        wav.writeframes(b"\x00\x00" * 64)
+    return output.getvalue()[:server.SNIFF_BYTES]
+
+
+SAMPLES = [
+    ("photo.png", image_head("PNG"), ("image", "image/png")),
+    ("photo.jpg", image_head("JPEG"), ("image", "image/jpeg")),
+    ("anim.gif", image_head("GIF"), ("image", "image/gif")),
+    ("photo.webp", image_head("WEBP"), ("image", "image/webp")),
+    ("scan.bmp", image_head("BMP"), ("image", "image/bmp")),
+    ("voice.wav", wav_head(), ("audio", "audio/wav")),
+    ("clip.mp4", b"\x00\x00\x00\x20ftypisom\x00\x00\x02\x00isomiso2avc1mp41\x00\x00\x00\x08free",
+     ("video", "video/mp4")),
+    ("song.m4a", b"\x00\x00\x00\x1cftypM4A \x00\x00\x00\x00M4A mp42isom\x00\x00\x00\x08free",
+     ("audio", "audio/mp4")),
+    ("song.flac", b"fLaC\x00\x00\x00\x22\x10\x00\x10\x00\x00\x00\x0e\x00\x1a\x00\x0a\xc4\x42\xf0",
+     ("audio", "audio/flac")),
+    ("song.mp3", b"\xff\xfb\x90\x64\x00\x00\x00\x00\x00\x00", ("audio", "audio/mpeg")),
+    ("notes.txt", b"Shopping list\n- eggs\n- milk\n", ("text", "text/plain; charset=utf-8")),
+    ("a.txt", b"BM is a car brand", ("text", "text/plain; charset=utf-8")),
+    ("noext", b"BM is a car brand, and this line runs on", ("text", "text/plain; charset=utf-8")),
+    ("clip.webm", b"\x1aE\xdf\xa3\x9fB\x86\x81\x01B\xf7\x81\x01B\x82\x84webm", ("video", "video/webm")),
+    ("clip.mkv", b"\x1aE\xdf\xa3\xa3B\x86\x81\x01B\xf7\x81\x01B\x82\x88matroska", ("video", "video/x-matroska")),
+    ("misnamed.txt", image_head("PNG"), ("image", "image/png")),
+    ("blob.bin", b"\x00\x01\x02\x03\xfe\xff", ("file", "application/octet-stream")),
+]
+
+
+@pytest.mark.parametrize("filename,head,expected", SAMPLES, ids=[sample[0] for sample in SAMPLES])
+def test_sniff_file_type(filename, head, expected):
+    assert server.sniff_file_type(head, filename) == expected
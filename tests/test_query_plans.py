@@ -0,0 +1,34 @@
+"""Hot queries are index-backed; needs a real mongod on MONGO_URL"""
+import os
+
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+async def mongo_backend(backend, monkeypatch):
+    client = backend.AsyncIOMotorClient(os.environ["MONGO_URL"], serverSelectionTimeoutMS=1000)
+    try:
+        await client.admin.command("ping")
+    except Exception as e:
+        client.close()
+        pytest.skip(f"MongoDB is not reachable: {e}")
+    monkeypatch.setenv("DB_NAME", f"{os.environ.get('DB_NAME', 'test_database')}_query_plans")
+    backend.bind_db(client)
+    await backend.ensure_indexes()
+    yield backend
+    await client.drop_database(os.environ["DB_NAME"])
+    client.close()
+
+
+async def test_hot_queries_use_indexes(mongo_backend):
+    for i in range(50):
+        profile = mongo_backend.UserProfile(name=f"User {i}", email=f"user{i}@example.com", bio="plays chess")
+        await mongo_backend.db.user_profiles.insert_one(mongo_backend.profile_document(profile))
+
+    plans = await mongo_backend.check_query_plans()
+
+    for name, stages in plans.items():
+        assert "COLLSCAN" not in stages, f"{name}: {stages}"
+        assert "SORT" not in stages, f"{name}: {stages}"